@@ -1,3 +1,5 @@
+import os
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
@@ -5,33 +7,40 @@ import plotly.express as px
 import plotly.graph_objects as go
 
 from dash.dependencies import Input, Output
+from flask import jsonify
 
-import pandas as pd
 import numpy as np
 
 from functions import *
+from data_store import DataStore
+from figure_cache import LRUCache
+from metrics import instrument
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 server = app.server
 
-sim_df = pd.read_csv('data/voting_sim.csv', index_col=0)
-cur_sim_df = pd.read_csv('data/vs_current.csv', index_col=0)
-data_df = pd.read_csv('data/sen_data.csv', index_col=0)
-with open('data/sen_info.p', 'rb') as f:
-    sen_info = pickle.load(f)
+# Opt-in callback metrics at /metrics, the directory must be shared by all workers
+if os.environ.get('DASH_METRICS_DIR'):
+    metrics = instrument(app, os.environ['DASH_METRICS_DIR'])
+else:
+    metrics = None
+
+# Dashboard data, swapped for the new generation in the background after each ETL run
+store = DataStore(on_reload=lambda snapshot: figure_cache.invalidate(snapshot.generation))
+
+# Figures already built for a filter combination or senator (keys include the generation)
+# status() does not start the watcher, so a preloading gunicorn master does not poll
+figure_cache = LRUCache(maxsize=256, generation=store.status()['generation'])
 
-with open('./last_update.txt', 'r') as f:
-    last_update = f.readlines()[0]
+@server.route('/figure-cache')
+def figure_cache_stats():
+    return jsonify(figure_cache.stats())
 
-# Options
-states = list(set([ sen[5] for sen in sen_info ]))
-states.sort()
-genders = list(set([ sen[4] for sen in sen_info ]))
-genders.sort()
-parties = list(set([ sen[3] for sen in sen_info ]))
-parties.sort()
+@server.route('/data-store')
+def data_store_status():
+    return jsonify(store.status())
 
 # Loading figure
 loading_fig = go.Figure(go.Scatter())
@@ -67,142 +76,222 @@ no_fig.update_layout(
     height=400
 )
 
-app.layout = html.Div(children=[
-    html.H1(children=[
-        'Senator Similarity Dashboard',
-        html.A(
-            html.Img(
-                src='assets/GitHub-Mark-64px.png',
-                style={'float': 'right', 'height': '50px'}
-            ), href='https://github.com/wplam107/senate_project'
-        )
-    ]),
-    html.H5(f'Last Update: {last_update}'),
-    dcc.Tabs([
-        dcc.Tab(label='Visualization of Congress', children=[
-            html.Div(children=[
-                html.H3('Senator Votes in 2-Dimensions'),
-                html.Div(children=[
-                    html.Div(children=[
-                        dcc.Markdown(
-                            '''
-                            In this plot senator votes over the current Congress has been projected onto 2 dimensions
-                            using principal component analysis (PCA).  PCA in this plot is only used as an aid for visualization.
-                            Clustering of senators with KMeans (5 clusters) was performed on the senators across all votes
-                            in the current Congress (each vote treated as a feature).  Clusters were assigned 
-                            names based on the most senior (most votes on bills) member.
-                            '''
-                        ),
-                        dcc.RadioItems(
-                            id='disable-state',
-                            options=[
-                                {'label': 'All States', 'value': 'disable'},
-                                {'label': 'Select States', 'value': 'enable'}
-                            ],
-                            labelStyle={'display': 'inline-block'},
-                            value='disable',
-                        ),
-                        dcc.Dropdown(
-                            id='state-pca',
-                            options=[ {'label': state, 'value': state} for state in states ],
-                            multi=True,
-                            disabled=False,
-                            placeholder='Select State(s)',
-                            clearable=False
-                        ),
-                        dcc.RadioItems(
-                            id='disable-gender',
-                            options=[
-                                {'label': 'All Genders', 'value': 'disable'},
-                                {'label': 'Select Genders', 'value': 'enable'}
-                            ],
-                            labelStyle={'display': 'inline-block'},
-                            value='disable',
-                        ),
-                        dcc.Dropdown(
-                            id='gender-pca',
-                            options=[ {'label': gender, 'value': gender} for gender in genders ],
-                            multi=True,
-                            disabled=False,
-                            placeholder='Select Gender(s)',
-                            clearable=False
-                        ),
-                        dcc.RadioItems(
-                            id='disable-party',
-                            options=[
-                                {'label': 'All Parties', 'value': 'disable'},
-                                {'label': 'Select Parties', 'value': 'enable'}
-                            ],
-                            labelStyle={'display': 'inline-block'},
-                            value='disable',
-                        ),
-                        dcc.Dropdown(
-                            id='party-pca',
-                            options=[ {'label': party, 'value': party} for party in parties ],
-                            multi=True,
-                            disabled=False,
-                            placeholder='Select Party/Parties',
-                            clearable=False
-                        ),
-                    ], className='six columns'),
-                    html.Div(dcc.Graph(id='pca-plot', figure=loading_fig), className='six columns')
-                ], className='row')
-            ])
+# Options for the filter dropdowns
+def filter_options(snapshot):
+    registry = snapshot.registry
+    return registry.values('state'), registry.values('gender'), registry.values('party')
+
+# Layout built on each page load, so options and the update date follow the data
+def serve_layout():
+    snapshot = store.snapshot
+    states, genders, parties = filter_options(snapshot)
+    return html.Div(children=[
+        html.H1(children=[
+            'Senator Similarity Dashboard',
+            html.A(
+                html.Img(
+                    src='assets/GitHub-Mark-64px.png',
+                    style={'float': 'right', 'height': '50px'}
+                ), href='https://github.com/wplam107/senate_project'
+            )
         ]),
-        dcc.Tab(label='Senator Similarities', children=[
-            html.Div([
-                html.H3('Most and Least Similar'),
+        html.H5(f'Last Update: {snapshot.last_update}'),
+        dcc.Tabs([
+            dcc.Tab(label='Visualization of Congress', children=[
                 html.Div(children=[
+                    html.H3('Senator Votes in 2-Dimensions'),
                     html.Div(children=[
-                        dcc.Markdown(
-                            '''
-                            For a selected senator, the plots to the right illustrate the Top 10 most similar senators
-                            and Bottom 10 least similar senators based on voting agreement of the current Congress.
-                            Senators may be filtered by state, gender, and party.
-                            '''
-                        ),
                         html.Div(children=[
-                            html.Div(dcc.Dropdown(
-                                id='state-sim',
+                            dcc.Markdown(
+                                '''
+                                In this plot senator votes over the current Congress has been projected onto 2 dimensions
+                                using principal component analysis (PCA).  PCA in this plot is only used as an aid for visualization.
+                                Clustering of senators with KMeans (5 clusters) was performed on the senators across all votes
+                                in the current Congress (each vote treated as a feature).  Clusters were assigned 
+                                names based on the most senior (most votes on bills) member.
+                                '''
+                            ),
+                            dcc.RadioItems(
+                                id='disable-state',
+                                options=[
+                                    {'label': 'All States', 'value': 'disable'},
+                                    {'label': 'Select States', 'value': 'enable'}
+                                ],
+                                labelStyle={'display': 'inline-block'},
+                                value='disable',
+                            ),
+                            dcc.Dropdown(
+                                id='state-pca',
                                 options=[ {'label': state, 'value': state} for state in states ],
-                                placeholder='Filter State',
-                                value=None
-                            ), style={'width': '33%', 'display': 'inline-block'}),
-                            html.Div(dcc.Dropdown(
-                                id='gender-sim',
+                                multi=True,
+                                disabled=False,
+                                placeholder='Select State(s)',
+                                clearable=False
+                            ),
+                            dcc.RadioItems(
+                                id='disable-gender',
+                                options=[
+                                    {'label': 'All Genders', 'value': 'disable'},
+                                    {'label': 'Select Genders', 'value': 'enable'}
+                                ],
+                                labelStyle={'display': 'inline-block'},
+                                value='disable',
+                            ),
+                            dcc.Dropdown(
+                                id='gender-pca',
                                 options=[ {'label': gender, 'value': gender} for gender in genders ],
-                                placeholder='Filter Gender',
-                                value=None
-                            ), style={'width': '33%', 'display': 'inline-block'}),
-                            html.Div(dcc.Dropdown(
-                                id='party-sim',
+                                multi=True,
+                                disabled=False,
+                                placeholder='Select Gender(s)',
+                                clearable=False
+                            ),
+                            dcc.RadioItems(
+                                id='disable-party',
+                                options=[
+                                    {'label': 'All Parties', 'value': 'disable'},
+                                    {'label': 'Select Parties', 'value': 'enable'}
+                                ],
+                                labelStyle={'display': 'inline-block'},
+                                value='disable',
+                            ),
+                            dcc.Dropdown(
+                                id='party-pca',
                                 options=[ {'label': party, 'value': party} for party in parties ],
-                                placeholder='Filter Party',
-                                value=None
-                            ), style={'width': '33%', 'display': 'inline-block'}),
-                            html.Div(dcc.Dropdown(
-                                id='sen-select',
-                                options=[ {'label': sen, 'value': sen} for sen in sen_by_q(sen_info) ],
-                                placeholder='Select Senator',
+                                multi=True,
+                                disabled=False,
+                                placeholder='Select Party/Parties',
+                                clearable=False
+                            ),
+                        ], className='six columns'),
+                        html.Div(dcc.Graph(id='pca-plot', figure=loading_fig), className='six columns')
+                    ], className='row')
+                ])
+            ]),
+            dcc.Tab(label='Senator Similarities', children=[
+                html.Div([
+                    html.H3('Most and Least Similar'),
+                    html.Div(children=[
+                        html.Div(children=[
+                            dcc.Markdown(
+                                '''
+                                For a selected senator, the plots to the right illustrate the Top 10 most similar senators
+                                and Bottom 10 least similar senators based on voting agreement of the selected Congress.
+                                Senators may be filtered by state, gender, and party.
+                                '''
+                            ),
+                            dcc.Dropdown(
+                                id='congress-sim',
+                                options=[ {'label': f'Congress {c}', 'value': c} for c in reversed(snapshot.congresses) ],
+                                value=snapshot.current_congress,
+                                clearable=False
+                            ),
+                            html.Div(children=[
+                                html.Div(dcc.Dropdown(
+                                    id='state-sim',
+                                    options=[ {'label': state, 'value': state} for state in states ],
+                                    placeholder='Filter State',
+                                    value=None
+                                ), style={'width': '33%', 'display': 'inline-block'}),
+                                html.Div(dcc.Dropdown(
+                                    id='gender-sim',
+                                    options=[ {'label': gender, 'value': gender} for gender in genders ],
+                                    placeholder='Filter Gender',
+                                    value=None
+                                ), style={'width': '33%', 'display': 'inline-block'}),
+                                html.Div(dcc.Dropdown(
+                                    id='party-sim',
+                                    options=[ {'label': party, 'value': party} for party in parties ],
+                                    placeholder='Filter Party',
+                                    value=None
+                                ), style={'width': '33%', 'display': 'inline-block'}),
+                                html.Div(dcc.Dropdown(
+                                    id='sen-select',
+                                    options=[
+                                        {'label': sen, 'value': sen} for sen in sen_by_q(snapshot.registry)
+                                        if sen in snapshot.congress_senators[snapshot.current_congress]
+                                    ],
+                                    placeholder='Select Senator',
+                                    value=None
+                                ), style={'width': '99%'}),
+                                dcc.RadioItems(
+                                    id='sim-scope',
+                                    options=[
+                                        {'label': 'Compare to All Senators', 'value': 'all'},
+                                        {'label': 'Compare Within Party', 'value': 'party'}
+                                    ],
+                                    labelStyle={'display': 'inline-block'},
+                                    value='all',
+                                )
+                            ]),
+                        ]),
+                        html.Div(children=[
+                            html.Div(dcc.Graph(
+                                id='most-similar',
+                                figure=no_fig
+                            ), className='six columns'),
+                            html.Div(dcc.Graph(
+                                id='least-similar',
+                                figure=no_fig
+                            ), className='six columns')
+                        ]),
+                        html.Div(children=[
+                            html.H3('Split Votes'),
+                            dcc.Markdown(
+                                '''
+                                Roll calls of the selected Congress where the selected senator and the senator
+                                below voted on opposite sides.
+                                '''
+                            ),
+                            dcc.Dropdown(
+                                id='drill-senator',
+                                options=[],
+                                placeholder='Compare With Senator',
                                 value=None
-                            ), style={'width': '99%'})
+                            ),
+                            dcc.Graph(id='drill-down', figure=no_fig)
                         ]),
-                    ]),
+                    ])
+                ])
+            ]),
+            dcc.Tab(label='Agreement Over Time', children=[
+                html.Div([
+                    html.H3('Rolling Agreement of Two Senators'),
+                    dcc.Markdown(
+                        '''
+                        Rate of agreement of two current senators on the bills both voted yes/no on, over a
+                        rolling window of voting days across all Congresses in the data.
+                        '''
+                    ),
                     html.Div(children=[
-                        html.Div(dcc.Graph(
-                            id='most-similar',
-                            figure=no_fig
-                        ), className='six columns'),
-                        html.Div(dcc.Graph(
-                            id='least-similar',
-                            figure=no_fig
-                        ), className='six columns')
+                        html.Div(dcc.Dropdown(
+                            id='pair-a',
+                            options=[ {'label': sen, 'value': sen} for sen in snapshot.pairs.senators ],
+                            placeholder='Select Senator',
+                            value=None
+                        ), style={'width': '49%', 'display': 'inline-block'}),
+                        html.Div(dcc.Dropdown(
+                            id='pair-b',
+                            options=[ {'label': sen, 'value': sen} for sen in snapshot.pairs.senators ],
+                            placeholder='Select Senator',
+                            value=None
+                        ), style={'width': '49%', 'display': 'inline-block'}),
                     ]),
+                    html.Label('Window (voting days)'),
+                    dcc.Slider(
+                        id='pair-window',
+                        min=5,
+                        max=250,
+                        step=5,
+                        value=50,
+                        marks={ days: str(days) for days in (5, 50, 100, 150, 200, 250) }
+                    ),
+                    dcc.Graph(id='pair-agreement', figure=no_fig)
                 ])
             ])
-        ])
-    ]),
-])
+        ]),
+    ])
+
+app.layout = serve_layout
 
 @app.callback(
     Output('state-pca', 'disabled'),
@@ -240,37 +329,98 @@ def pca_state_disable(value):
     Input('disable-gender', 'value'),
     Input('disable-party', 'value')])
 def update_pca_plot(state, gender, party, s, g, p):
+    snapshot = store.snapshot
+    states, genders, parties = filter_options(snapshot)
     if s == 'disable':
         state = states
     if g == 'disable':
         gender = genders
     if p == 'disable':
         party = parties
-    return pca_plot(data_df, sen_info, state=state, gender=gender, party=party)
+    return figure_cache.get_or_create(
+        ('pca', snapshot.generation, state, gender, party),
+        lambda: pca_plot(snapshot.data_df, snapshot.registry, state=state, gender=gender, party=party)
+    )
 
 @app.callback(
     Output('sen-select', 'options'),
     [Input('state-sim', 'value'),
     Input('gender-sim', 'value'),
-    Input('party-sim', 'value')])
-def update_sen_select(state, gender, party):
+    Input('party-sim', 'value'),
+    Input('congress-sim', 'value')])
+def update_sen_select(state, gender, party, congress):
+    snapshot = store.snapshot
+    members = snapshot.congress_senators.get(congress, set())
     if state == None and gender == None and party == None:
-        return [ {'label': sen, 'value': sen} for sen in sen_by_q(sen_info) ]
+        return [ {'label': sen, 'value': sen} for sen in sen_by_q(snapshot.registry) if sen in members ]
     else:
-        return [ {'label': sen, 'value': sen} for sen in sen_by_q(sen_info, state=state, gender=gender, party=party) ]
+        return [
+            {'label': sen, 'value': sen}
+            for sen in sen_by_q(snapshot.registry, state=state, gender=gender, party=party) if sen in members
+        ]
 
 @app.callback(
     [Output('least-similar', 'figure'),
     Output('most-similar', 'figure')],
-    [Input('sen-select', 'value')])
-def update_sim_plots(senator):
-    if senator == None:
+    [Input('sen-select', 'value'),
+    Input('sim-scope', 'value'),
+    Input('congress-sim', 'value')])
+def update_sim_plots(senator, scope, congress):
+    snapshot = store.snapshot
+    if senator == None or senator not in snapshot.congress_senators.get(congress, set()):
         return no_fig, no_fig
     else:
-        least_sim, most_sim = sim_plot(cur_sim_df, senator)
-        least_sim.update_layout(width=600, height=400)
-        most_sim.update_layout(width=600, height=400)
-        return least_sim, most_sim
+        return figure_cache.get_or_create(
+            ('sim', snapshot.generation, senator, scope, congress),
+            lambda: build_sim_plots(snapshot, senator, scope, congress)
+        )
+
+def build_sim_plots(snapshot, senator, scope, congress):
+    least_sim, most_sim = sim_plot(snapshot.neighbors[(congress, scope)], senator)
+    least_sim.update_layout(width=600, height=400)
+    most_sim.update_layout(width=600, height=400)
+    return least_sim, most_sim
+
+@app.callback(
+    Output('drill-senator', 'options'),
+    [Input('sen-select', 'value'),
+    Input('congress-sim', 'value')])
+def update_drill_select(senator, congress):
+    snapshot = store.snapshot
+    members = snapshot.congress_senators.get(congress, set())
+    return [ {'label': sen, 'value': sen} for sen in sorted(members) if sen != senator ]
+
+@app.callback(
+    Output('drill-down', 'figure'),
+    [Input('sen-select', 'value'),
+    Input('drill-senator', 'value'),
+    Input('congress-sim', 'value')])
+def update_drill_down(senator, other, congress):
+    snapshot = store.snapshot
+    position = snapshot.bits.position
+    if senator not in position or other not in position or senator == other:
+        return no_fig
+    else:
+        return figure_cache.get_or_create(
+            ('drill', snapshot.generation, senator, other, congress),
+            lambda: disagreement_table(snapshot.bits, senator, other, congress)
+        )
+
+@app.callback(
+    Output('pair-agreement', 'figure'),
+    [Input('pair-a', 'value'),
+    Input('pair-b', 'value'),
+    Input('pair-window', 'value')])
+def update_pair_plot(sen_a, sen_b, window):
+    snapshot = store.snapshot
+    position = snapshot.pairs.position
+    if sen_a not in position or sen_b not in position or sen_a == sen_b:
+        return no_fig
+    else:
+        return figure_cache.get_or_create(
+            ('pair', snapshot.generation, sen_a, sen_b, window),
+            lambda: agreement_plot(snapshot.pairs, sen_a, sen_b, window)
+        )
 
 if __name__ == '__main__':
     app.run_server()
\ No newline at end of file
@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+# Version of the bundle layout, bumped when files or index keys change meaning
+FORMAT_VERSION = 1
+
+# Directory of the data bundle inside the app
+BUNDLE_DIR = 'data/bundle'
+
+# Loaded bundle, arrays are read-only memory maps of the .npy files
+Bundle = namedtuple('Bundle', ['generation', 'arrays', 'index'])
+
+# Function to give the row of pair (i, j), i < j, in the upper triangle order of n senators
+# (the order of the pair arrays, shared with agreement_series)
+def pair_position(i, j, n):
+    return i * n - i * (i + 1) // 2 + (j - i - 1)
+
+# Function to write a new generation of the bundle
+def write_bundle(root, arrays, index, keep=2):
+    """
+    arrays maps names to numpy arrays (saved as name.npy) and index is a json
+    serializable dict of names and metadata. Files go to a new generation
+    directory and manifest.json is replaced last, so readers only ever see a
+    complete generation.
+    """
+    generation = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    gen_dir = os.path.join(root, f'gen-{generation}')
+    os.makedirs(gen_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(gen_dir, f'{name}.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(gen_dir, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'generation': generation,
+        'path': f'gen-{generation}',
+        'arrays': sorted(arrays),
+    }
+    tmp_path = os.path.join(root, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(root, 'manifest.json'))
+
+    # Remove old generations (workers still mapping them keep their pages)
+    generations = sorted(name for name in os.listdir(root) if name.startswith('gen-'))
+    for name in generations[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return generation
+
+# Function to read the generation currently in the manifest
+def read_generation(root):
+    with open(os.path.join(root, 'manifest.json')) as f:
+        return json.load(f)['generation']
+
+# Function to open the current generation of the bundle
+def load_bundle(root=BUNDLE_DIR):
+    with open(os.path.join(root, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['format'] != FORMAT_VERSION:
+        raise ValueError(f'Bundle format {manifest["format"]} is not supported (expected {FORMAT_VERSION})')
+    gen_dir = os.path.join(root, manifest['path'])
+    arrays = {
+        name: np.load(os.path.join(gen_dir, f'{name}.npy'), mmap_mode='r')
+        for name in manifest['arrays']
+    }
+    with open(os.path.join(gen_dir, 'index.json')) as f:
+        index = json.load(f)
+    return Bundle(manifest['generation'], arrays, index)
@@ -0,0 +1,158 @@
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+from bundle import load_bundle, read_generation, BUNDLE_DIR
+from functions import neighbor_index, pair_series, vote_bits
+from registry import SenatorRegistry
+
+# Seconds between checks for a new bundle generation or last update
+RELOAD_INTERVAL = 30
+
+LAST_UPDATE = './last_update.txt'
+
+# Everything the callbacks read, built from one bundle generation
+Snapshot = namedtuple('Snapshot', [
+    'generation', 'bundle', 'sim_df', 'cur_sim_df', 'data_df', 'registry',
+    'neighbors', 'congresses', 'current_congress', 'congress_senators', 'pairs', 'bits', 'last_update',
+])
+
+def read_last_update(path=LAST_UPDATE):
+    with open(path, 'r') as f:
+        return f.readlines()[0]
+
+# Function to build a snapshot of the current bundle generation
+def load_snapshot(root=BUNDLE_DIR, last_update_path=LAST_UPDATE):
+    bundle = load_bundle(root)
+    # Similarity matrices are memory mapped, so workers share the pages
+    sim_df = pd.DataFrame(
+        bundle.arrays['sim'],
+        index=bundle.index['senators'],
+        columns=bundle.index['senators'],
+        copy=False
+    )
+    cur_sim_df = pd.DataFrame(
+        bundle.arrays['sim_current'],
+        index=bundle.index['current_senators'],
+        columns=bundle.index['current_senators'],
+        copy=False
+    )
+    congresses = bundle.index['congresses']
+    return Snapshot(
+        generation=bundle.generation,
+        bundle=bundle,
+        sim_df=sim_df,
+        cur_sim_df=cur_sim_df,
+        data_df=pd.DataFrame(bundle.index['sen_data']),
+        registry=SenatorRegistry(bundle.index['sen_info']),
+        # Neighbor index for each congress and comparison scope
+        neighbors={
+            (congress, scope): neighbor_index(bundle, '' if scope == 'all' else scope, congress)
+            for congress in congresses for scope in ('all', 'party')
+        },
+        congresses=congresses,
+        current_congress=bundle.index['current_congress'],
+        congress_senators={ int(c): set(sens) for c, sens in bundle.index['congress_senators'].items() },
+        pairs=pair_series(bundle),
+        bits=vote_bits(bundle),
+        last_update=read_last_update(last_update_path),
+    )
+
+# Holder of the current snapshot, reloaded in the background
+class DataStore:
+    """
+    A callback reads store.snapshot once and uses only that object, so it sees a
+    single generation even if a reload lands mid-request. A new snapshot is fully
+    built by the watcher thread before the reference is swapped, requests never
+    wait on a reload. on_reload(snapshot) runs after each swap (to invalidate caches).
+    """
+    def __init__(self, root=BUNDLE_DIR, last_update_path=LAST_UPDATE, interval=RELOAD_INTERVAL, on_reload=None):
+        self.root = root
+        self.last_update_path = last_update_path
+        self.interval = interval
+        self.on_reload = on_reload
+        self.stamp = self.read_stamp()
+        self._snapshot = load_snapshot(root, last_update_path)
+        self.reloads = 0
+        self.error = None
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.pid = None
+        self.thread = None
+
+    @property
+    def snapshot(self):
+        # Threads do not survive a fork (gunicorn --preload), start the watcher in each worker
+        if self.interval and self.pid != os.getpid():
+            self.start()
+        return self._snapshot
+
+    def read_stamp(self):
+        """
+        Bundle generation and last update modification time, a change in either means reload
+        """
+        try:
+            mtime = os.stat(self.last_update_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        return read_generation(self.root), mtime
+
+    def reload(self, force=False):
+        """
+        Load and swap in a new snapshot if the stamp changed, True if swapped
+        """
+        with self.lock:
+            stamp = self.read_stamp()
+            if stamp == self.stamp and not force:
+                return False
+            if stamp[0] == self._snapshot.generation and not force:
+                # Only the update date changed
+                snapshot = self._snapshot._replace(last_update=read_last_update(self.last_update_path))
+            else:
+                snapshot = load_snapshot(self.root, self.last_update_path)
+            self._snapshot = snapshot
+            self.stamp = stamp
+            self.reloads += 1
+        if self.on_reload is not None:
+            self.on_reload(snapshot)
+        return True
+
+    def watch(self):
+        while not self.stop.wait(self.interval):
+            try:
+                self.reload()
+                self.error = None
+            except Exception as e:
+                # A half written or broken bundle keeps the old snapshot, retried next interval
+                self.error = repr(e)
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.stop = threading.Event()
+            self.thread = threading.Thread(target=self.watch, name='data-store-reload', daemon=True)
+            self.thread.start()
+
+    def close(self, timeout=5):
+        """
+        Stop the watcher of this process (gunicorn worker_exit), a later read starts it again
+        """
+        with self.lock:
+            thread, owned = self.thread, self.pid == os.getpid()
+            self.stop.set()
+            self.pid = None
+            self.thread = None
+        if owned and thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def status(self):
+        return {
+            'generation': self._snapshot.generation,
+            'last_update': self._snapshot.last_update,
+            'reloads': self.reloads,
+            'error': self.error,
+        }
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+# Function to make callback inputs hashable and order independent
+def normalize(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(value))
+    return value
+
+# Bounded least recently used cache of figures
+class LRUCache:
+    """
+    Entries belong to one data generation (the bundle generation), asking for a
+    different generation empties the cache
+    """
+    def __init__(self, maxsize=256, generation=None):
+        self.maxsize = maxsize
+        self.generation = generation
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, generation=None):
+        with self.lock:
+            self.entries.clear()
+            self.generation = generation
+
+    def get_or_create(self, key, build, generation=None):
+        """
+        Return the value cached under key, or build it with build() and cache it
+        """
+        if generation is not None and generation != self.generation:
+            self.invalidate(generation)
+        key = tuple(normalize(part) for part in key)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        # Built outside the lock so slow figures do not block other workers' threads
+        value = build()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'generation': self.generation,
+            }
@@ -1,59 +1,121 @@
 import numpy as np
 import pandas as pd
-import pickle
+from collections import namedtuple
+
+from bundle import pair_position
+from registry import SenatorRegistry
 
 import plotly.graph_objects as go
 import plotly.express as px
 
-# Function for filtering senators
+# Function for filtering senators (senator_info is a SenatorRegistry or rows of the senators table)
 def sen_by_q(senator_info, party=None, gender=None, state=None):
-    senators = []
-    if party == None:
-        party = ['R', 'D', 'ID']
-    if gender == None:
-        gender = ['M', 'F', 'N']
-    if type(party) != list:
-        party = [party]
-    if type(gender) != list:
-        gender = [gender]
-        
-    for senator in senator_info:
-        sen_name = f'{senator[1]} {senator[2]}'
-        if sen_name == 'Kelly Loeffler':
-            continue
-        if sen_name == 'Richard Shelby':
-            sen_party = 'R'
-        else:
-            sen_party = senator[3]
-        sen_gender = senator[4]
-        sen_state = senator[5]
-        if state == None:
-            if sen_party in party and sen_gender in gender:
-                senators.append(sen_name)
-        else:
-            if type(state) != list:
-                state = [state]
-            if sen_party in party and sen_gender in gender and sen_state in state:
-                senators.append(sen_name)
-    senators.sort()
-    return senators
+    if not isinstance(senator_info, SenatorRegistry):
+        senator_info = SenatorRegistry(senator_info)
+    return senator_info.query(party=party, gender=gender, state=state)
+
+# Precomputed most/least similar senators (rows of most/least are positions in senators)
+NeighborIndex = namedtuple('NeighborIndex', ['senators', 'position', 'sim', 'most', 'least'])
+
+# Function to create neighbor index from the bundle, variant '' for all senators or 'party'
+def neighbor_index(bundle, variant='', congress=None):
+    """
+    Without congress the current congress is used, otherwise the congress slice
+    of the similarity cube (a view of the memory map, nothing is copied)
+    """
+    suffix = f'{variant}_' if variant else ''
+    senators = bundle.index['current_senators']
+    if congress is None:
+        sim = bundle.arrays['sim_current']
+        most = bundle.arrays[f'topk_{suffix}most']
+        least = bundle.arrays[f'topk_{suffix}least']
+    else:
+        i = bundle.index['congresses'].index(congress)
+        sim = bundle.arrays['sim_cube'][i]
+        most = bundle.arrays[f'topk_cube_{suffix}most'][i]
+        least = bundle.arrays[f'topk_cube_{suffix}least'][i]
+    return NeighborIndex(senators, { sen: i for i, sen in enumerate(senators) }, sim, most, least)
+
+# Cumulative agreement/co-vote counts of each pair of current senators by vote day
+PairSeries = namedtuple('PairSeries', ['senators', 'position', 'days', 'agree', 'total'])
+
+def pair_series(bundle):
+    senators = bundle.index['pair_senators']
+    return PairSeries(
+        senators,
+        { sen: i for i, sen in enumerate(senators) },
+        bundle.index['vote_days'],
+        bundle.arrays['pair_agree_cum'],
+        bundle.arrays['pair_total_cum'],
+    )
+
+# Function for agreement rate of two senators over the last window vote days, at each day
+def rolling_agreement(series, sen_a, sen_b, window):
+    """
+    Differences of the prefix sums, only the pair's row is read. Days with no
+    shared yes/no vote in the window are NaN.
+    """
+    i, j = sorted((series.position[sen_a], series.position[sen_b]))
+    row = pair_position(i, j, len(series.senators))
+    agree = np.asarray(series.agree[row], dtype=np.int64)
+    total = np.asarray(series.total[row], dtype=np.int64)
+    end = np.arange(1, len(series.days) + 1)
+    start = np.maximum(end - window, 0)
+    shared = total[end] - total[start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(shared > 0, (agree[end] - agree[start]) / shared, np.nan)
+    return rate, shared
+
+# Packed vote bitsets of every senator (bit j of a row is bundle csr_ids[j])
+VoteBits = namedtuple('VoteBits', [
+    'senators', 'position', 'csr_ids', 'bill_ids', 'dates', 'ranges', 'yes', 'no', 'abstain',
+])
+
+# Number of set bits of each byte value
+POPCOUNT = np.array([ bin(i).count('1') for i in range(256) ], dtype=np.uint8)
+
+def vote_bits(bundle):
+    senators = bundle.index['senators']
+    return VoteBits(
+        senators,
+        { sen: i for i, sen in enumerate(senators) },
+        bundle.index['csr_ids'],
+        bundle.index['bill_ids'],
+        bundle.index['bill_dates'],
+        { int(c): tuple(r) for c, r in bundle.index['congress_ranges'].items() },
+        bundle.arrays['bits_yes'],
+        bundle.arrays['bits_no'],
+        bundle.arrays['bits_abstain'],
+    )
+
+# Function for the roll calls two senators split on (one yes, one no), optionally in one congress
+def disagreements(bits, sen_a, sen_b, congress=None):
+    """
+    Bitwise on the packed rows of the two senators, returns (positions of the
+    split roll calls, number of roll calls both voted yes/no on)
+    """
+    i, j = bits.position[sen_a], bits.position[sen_b]
+    shared = (bits.yes[i] | bits.no[i]) & (bits.yes[j] | bits.no[j])
+    if congress is not None:
+        start, stop = bits.ranges[congress]
+        in_congress = np.zeros(len(bits.csr_ids), dtype=bool)
+        in_congress[start:stop] = True
+        shared &= np.packbits(in_congress)
+    split = (bits.yes[i] ^ bits.yes[j]) & shared
+    columns = np.flatnonzero(np.unpackbits(split, count=len(bits.csr_ids)))
+    return columns, int(POPCOUNT[shared].sum())
 
 # Function for selected senator similarity
-def selected_senator_sim(sim_df, senator):
-    sen_sim = sim_df.loc[senator]
-    sen_list = list(sen_sim.index)
-    sen = [ (sen_list[i], sen_sim[i]) for i in range(len(sen_list)) if sen_list[i] != senator ]
-    sim_list = sorted(sen, key=lambda x: x[1])
-    least = sim_list[:10]
-    most = sim_list[::-1][:10]
+def selected_senator_sim(index, senator, k=10):
+    i = index.position[senator]
+    least = [ (index.senators[j], index.sim[i, j]) for j in index.least[i, :k] if j >= 0 ]
+    most = [ (index.senators[j], index.sim[i, j]) for j in index.most[i, :k] if j >= 0 ]
     return least, most
 
 def pca_plot(df, sen_info, party=None, gender=None, state=None):
     senators = sen_by_q(sen_info, party, gender, state)
     if len(senators) == 0:
         senators = sen_by_q(sen_info)
-    if 'Kelly Loeffler' in senators:
-        senators.remove('Kelly Loeffler')
     temp = df.set_index('name').loc[senators].reset_index()
     fig = px.scatter(
         temp,
@@ -68,11 +130,12 @@ def pca_plot(df, sen_info, party=None, gender=None, state=None):
     )
     return fig
 
-def sim_plot(df, senator):
-    least, most = selected_senator_sim(df, senator)
-    X1 = 100 * np.array([ sen[1] for sen in least ])
+def sim_plot(index, senator):
+    least, most = selected_senator_sim(index, senator)
+    # Similarities are stored as float32, round back to whole percentages
+    X1 = np.round(100 * np.array([ sen[1] for sen in least ], dtype=float), 2)
     Y1 = [ sen[0] for sen in least ]
-    X2 = 100 * np.array([ sen[1] for sen in most ])
+    X2 = np.round(100 * np.array([ sen[1] for sen in most ], dtype=float), 2)
     Y2 = [ sen[0] for sen in most ]
     
     fig1 = go.Figure(go.Bar(
@@ -96,4 +159,50 @@ def sim_plot(df, senator):
     ))
     fig2.update_layout(yaxis={'categoryorder':'total ascending'}, height=600, width=700)
     fig2.update_layout(title='Top 10: Most Similar Senators', xaxis_title='Rate of Agreement (%)')
-    return fig1, fig2
\ No newline at end of file
+    return fig1, fig2
+
+def agreement_plot(series, sen_a, sen_b, window):
+    rate, shared = rolling_agreement(series, sen_a, sen_b, window)
+    fig = go.Figure(go.Scatter(
+        x=series.days,
+        y=np.round(100 * rate, 2),
+        customdata=shared,
+        mode='lines',
+        hovertemplate=
+        'Date: %{x}' +
+        '<br>Percent Agreement: %{y}%' +
+        '<br>Shared Votes: %{customdata}<extra></extra>',
+    ))
+    fig.update_layout(
+        title=f'{sen_a} and {sen_b}: Agreement over the Last {window} Voting Days',
+        xaxis_title='Date',
+        yaxis_title='Rate of Agreement (%)',
+        yaxis={'range': [0, 100]},
+        height=500,
+        width=1000
+    )
+    return fig
+
+def disagreement_table(bits, sen_a, sen_b, congress=None):
+    columns, shared = disagreements(bits, sen_a, sen_b, congress)
+    m = len(bits.csr_ids)
+    yes_a = np.unpackbits(bits.yes[bits.position[sen_a]], count=m)[columns]
+    fig = go.Figure(go.Table(
+        header={'values': ['Roll Call', 'Bill', 'Date', sen_a, sen_b], 'align': 'left'},
+        cells={
+            'values': [
+                [ bits.csr_ids[j] for j in columns ],
+                [ bits.bill_ids[j] for j in columns ],
+                [ bits.dates[j] for j in columns ],
+                np.where(yes_a, 'Yes', 'No'),
+                np.where(yes_a, 'No', 'Yes'),
+            ],
+            'align': 'left'
+        }
+    ))
+    fig.update_layout(
+        title=f'Split on {len(columns)} of {shared} Shared Votes',
+        height=500,
+        width=1000
+    )
+    return fig
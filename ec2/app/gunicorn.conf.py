@@ -0,0 +1,12 @@
+import sys
+
+# Gunicorn reads this file from the working directory, see the Dockerfile
+
+# Function to stop the background threads of a worker before it exits
+def worker_exit(server, worker):
+    module = sys.modules.get('app')
+    if module is None:
+        return
+    if getattr(module, 'metrics', None) is not None:
+        module.metrics.close()
+    module.store.close()
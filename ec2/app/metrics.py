@@ -0,0 +1,275 @@
+import atexit
+import fcntl
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+
+# Histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6)
+
+# Seconds between background writes of a worker's snapshot
+FLUSH_INTERVAL = 1.0
+
+# Function to give the output string Dash sends for a callback's Output(s)
+def output_key(output):
+    if isinstance(output, (list, tuple)):
+        return '..' + '...'.join(f'{o.component_id}.{o.component_property}' for o in output) + '..'
+    return f'{output.component_id}.{output.component_property}'
+
+def empty_histogram(buckets):
+    return {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+
+def observe(histogram, buckets, value):
+    histogram['buckets'][bisect_left(buckets, value)] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+# Files of the metrics directory, live workers write worker-<pid>-<start>.json
+ARCHIVE = 'archive.json'
+LOCK = 'archive.lock'
+
+def read_json(file):
+    try:
+        with open(file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(file, value):
+    with open(f'{file}.tmp', 'w') as f:
+        json.dump(value, f)
+    os.replace(f'{file}.tmp', file)
+
+def worker_pid(name):
+    return int(name[len('worker-'):-len('.json')].split('-')[0])
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Function to add the series of callbacks to total
+def merge_callbacks(total, callbacks):
+    for key, series in callbacks.items():
+        if key not in total:
+            total[key] = series
+            continue
+        merged = total[key]
+        merged['errors'] += series['errors']
+        for hist in ('latency', 'size'):
+            merged[hist]['sum'] += series[hist]['sum']
+            merged[hist]['count'] += series[hist]['count']
+            merged[hist]['buckets'] = [ a + b for a, b in zip(merged[hist]['buckets'], series[hist]['buckets']) ]
+    return total
+
+# Function to sum the metrics of all workers of a directory, exited ones folded into the archive
+def collect_dir(path):
+    """
+    The file of an exited worker is added to path/archive.json and removed, so
+    a reused pid starts a new file and the totals never go backwards. The
+    archive lists the files it folded last, a fold interrupted before removing
+    them does not count them twice.
+    """
+    with open(os.path.join(path, LOCK), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = read_json(os.path.join(path, ARCHIVE)) or {'callbacks': {}, 'folded': []}
+        names = [ name for name in os.listdir(path) if name.startswith('worker-') and name.endswith('.json') ]
+        folded = [ name for name in names if name in archive['folded'] ]
+        exited = [ name for name in names if name not in folded and not is_alive(worker_pid(name)) ]
+        if exited:
+            for name in exited:
+                merge_callbacks(archive['callbacks'], read_json(os.path.join(path, name)) or {})
+            archive['folded'] = sorted(folded + exited)
+            write_json(os.path.join(path, ARCHIVE), archive)
+        total = merge_callbacks({}, archive['callbacks'])
+        for name in names:
+            if name in folded or name in exited:
+                try:
+                    os.remove(os.path.join(path, name))
+                except FileNotFoundError:
+                    pass
+            else:
+                merge_callbacks(total, read_json(os.path.join(path, name)) or {})
+    return total
+
+# Per-worker callback metrics, shared across gunicorn workers through a directory
+class CallbackMetrics:
+    """
+    Each worker keeps counters in memory, a background thread writes them to
+    path/worker-<pid>-<start>.json every FLUSH_INTERVAL (and close() on worker
+    exit), /metrics adds up the files of all workers (see collect_dir)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self.names = {}
+        self.dirty = False
+        self.stop = threading.Event()
+        self.pid = None
+        self.file = None
+        self.thread = None
+        os.makedirs(path, exist_ok=True)
+        atexit.register(self.close)
+
+    def start(self):
+        # Threads do not survive a fork (gunicorn --preload), each worker starts its own
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.file = os.path.join(self.path, f'worker-{self.pid}-{time.time_ns()}.json')
+            # Counters of the parent stay in the parent's file
+            self.callbacks = {}
+            self.stop = threading.Event()
+            self.thread = threading.Thread(target=self.run, name='metrics-flush', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stop.wait(FLUSH_INTERVAL):
+            if self.dirty:
+                self.flush()
+
+    def close(self, timeout=5):
+        """
+        Stop the flush thread of this process and write its counters one last time
+        """
+        with self.lock:
+            thread = self.thread if self.pid == os.getpid() else None
+            self.stop.set()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def series(self, name, output):
+        key = f'{name}|{output}'
+        if key not in self.callbacks:
+            self.callbacks[key] = {
+                'callback': name,
+                'output': output,
+                'latency': empty_histogram(LATENCY_BUCKETS),
+                'size': empty_histogram(SIZE_BUCKETS),
+                'errors': 0,
+            }
+        self.dirty = True
+        return self.callbacks[key]
+
+    def wrap(self, func, output):
+        name = func.__name__
+        self.names[output] = name
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if self.pid != os.getpid():
+                self.start()
+            start = time.perf_counter()
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                # PreventUpdate is how Dash skips an update, not an error
+                failed = type(e).__name__ != 'PreventUpdate'
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    series = self.series(name, output)
+                    observe(series['latency'], LATENCY_BUCKETS, elapsed)
+                    series['errors'] += failed
+        return timed
+
+    def record_response(self, response):
+        """
+        Flask after_request hook, records the size of callback responses
+        """
+        if request.path.endswith('_dash-update-component') and response.status_code == 200:
+            payload = request.get_json(silent=True) or {}
+            output = payload.get('output')
+            size = response.calculate_content_length()
+            if output is not None and size is not None:
+                if self.pid != os.getpid():
+                    self.start()
+                with self.lock:
+                    series = self.series(self.names.get(output, output), output)
+                    observe(series['size'], SIZE_BUCKETS, size)
+        return response
+
+    def flush(self):
+        with self.lock:
+            # Nothing recorded in this process yet
+            if self.pid != os.getpid():
+                return
+            snapshot = json.dumps(self.callbacks)
+            self.dirty = False
+        with open(f'{self.file}.tmp', 'w') as f:
+            f.write(snapshot)
+        os.replace(f'{self.file}.tmp', self.file)
+
+    def collect(self):
+        """
+        Sum of the snapshots of all workers, including exited ones
+        """
+        self.flush()
+        return collect_dir(self.path)
+
+    def render(self):
+        """
+        Prometheus text exposition format
+        """
+        callbacks = self.collect()
+        lines = []
+        for metric, hist, buckets, help_text in (
+            ('dash_callback_latency_seconds', 'latency', LATENCY_BUCKETS, 'Time spent in the callback function'),
+            ('dash_callback_response_bytes', 'size', SIZE_BUCKETS, 'Size of the serialized callback response'),
+        ):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for series in callbacks.values():
+                labels = f'callback="{series["callback"]}",output="{series["output"]}"'
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], series[hist]['buckets']):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{labels}}} {series[hist]["sum"]}')
+                lines.append(f'{metric}_count{{{labels}}} {series[hist]["count"]}')
+        lines.append('# HELP dash_callback_errors_total Callbacks that raised an exception')
+        lines.append('# TYPE dash_callback_errors_total counter')
+        for series in callbacks.values():
+            lines.append(
+                f'dash_callback_errors_total{{callback="{series["callback"]}",output="{series["output"]}"}} {series["errors"]}'
+            )
+        return '\n'.join(lines) + '\n'
+
+# Function to instrument every callback registered on app afterwards and add /metrics
+def instrument(app, path):
+    """
+    Must be called before the @app.callback decorators run
+    """
+    metrics = CallbackMetrics(path)
+    register_callback = app.callback
+
+    def callback(output, *args, **kwargs):
+        register = register_callback(output, *args, **kwargs)
+
+        def decorator(func):
+            return register(metrics.wrap(func, output_key(output)))
+        return decorator
+
+    app.callback = callback
+    app.server.after_request(metrics.record_response)
+    app.server.add_url_rule(
+        '/metrics',
+        'metrics',
+        lambda: (metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'})
+    )
+    return metrics
@@ -0,0 +1,73 @@
+# Corrections to the senators table, applied once when the registry is built
+EXCLUDED = {'Kelly Loeffler'}
+OVERRIDES = {'Richard Shelby': {'party': 'R'}}
+
+# Values allowed when a filter is not given (as in sen_by_q)
+DEFAULTS = {'party': ('R', 'D', 'ID'), 'gender': ('M', 'F', 'N'), 'state': None}
+
+FIELDS = ('party', 'gender', 'state')
+
+class Senator:
+    __slots__ = ('sen_id', 'name', 'party', 'gender', 'state')
+
+    def __init__(self, sen_id, name, party, gender, state):
+        self.sen_id = sen_id
+        self.name = name
+        self.party = party
+        self.gender = gender
+        self.state = state
+
+# Senators sorted by display name with a bitset per field value
+class SenatorRegistry:
+    """
+    Bit i of a bitset is set when the i-th senator (in name order) has that value,
+    so a filter is a union of bitsets per field and an intersection across fields
+    """
+    def __init__(self, sen_info, excluded=EXCLUDED, overrides=OVERRIDES):
+        senators = []
+        for sen_id, f_name, l_name, party, gender, state in sen_info:
+            name = f'{f_name} {l_name}'
+            if name in excluded:
+                continue
+            senator = Senator(sen_id, name, party, gender, state)
+            for field, value in overrides.get(name, {}).items():
+                setattr(senator, field, value)
+            senators.append(senator)
+        senators.sort(key=lambda sen: sen.name)
+
+        self.senators = senators
+        self.names = [ sen.name for sen in senators ]
+        self.by_name = { sen.name: sen for sen in senators }
+        self.all = (1 << len(senators)) - 1
+        self.index = { field: {} for field in FIELDS }
+        for i, sen in enumerate(senators):
+            for field in FIELDS:
+                value = getattr(sen, field)
+                self.index[field][value] = self.index[field].get(value, 0) | (1 << i)
+
+    def values(self, field):
+        return sorted(self.index[field])
+
+    def bits(self, field, values):
+        if values is None:
+            values = DEFAULTS[field]
+            if values is None:
+                return self.all
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        bits = 0
+        for value in values:
+            bits |= self.index[field].get(value, 0)
+        return bits
+
+    def query(self, party=None, gender=None, state=None):
+        """
+        Names of matching senators, already in sorted order
+        """
+        bits = self.bits('party', party) & self.bits('gender', gender) & self.bits('state', state)
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.names[low.bit_length() - 1])
+            bits ^= low
+        return names
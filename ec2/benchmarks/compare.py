@@ -0,0 +1,19 @@
+import json
+import sys
+
+# Function to key results of a run by (stage, congresses)
+def timings(path):
+    with open(path) as f:
+        run = json.load(f)
+    return run['commit'], { (r['stage'], r['congresses']): r.get('seconds') for r in run['results'] }
+
+if __name__ == '__main__':
+    # python compare.py OLD.json NEW.json
+    old_commit, old = timings(sys.argv[1])
+    new_commit, new = timings(sys.argv[2])
+    print(f'{"stage":<24}{"congresses":>11}{old_commit or "old":>12}{new_commit or "new":>12}{"speedup":>10}')
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        speedup = f'{before / after:.2f}x' if before and after else '-'
+        fmt = lambda t: f'{t:.4f}' if t is not None else '-'
+        print(f'{key[0]:<24}{key[1]:>11}{fmt(before):>12}{fmt(after):>12}{speedup:>10}')
@@ -0,0 +1,259 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, '..', 'utils'))
+sys.path.append(os.path.join(HERE, '..', 'app'))
+
+from synthetic import synthetic_senate
+from votes import encode_votes, pivot_votes
+from vote_matrix import VoteMatrix
+from similarity import (
+    fast_similarity_matrix, similarity_from_counts, refresh_counts, save_counts, update_counts,
+    empty_counts, counts_similarity, topk_neighbors
+)
+from registry import SenatorRegistry
+
+# Optional parts, stages needing them are recorded as skipped
+try:
+    import to_csv
+except ImportError:
+    to_csv = None
+try:
+    import functions
+except ImportError:
+    functions = None
+
+# Sizes in congresses (1 congress up to the 101st-116th history)
+SIZES = [1, 4, 16]
+
+# Registered stages: name -> (function building the timed callable, largest size to run)
+STAGES = {}
+
+def stage(name, max_size=None, needs=None):
+    def register(func):
+        STAGES[name] = (func, max_size, needs)
+        return func
+    return register
+
+# Inputs shared by the stages of one size
+class Context:
+    def __init__(self, congresses, seed=0):
+        self.senate = synthetic_senate(congresses, seed=seed)
+        self.coded = encode_votes(self.senate.votes)
+        self.votes = VoteMatrix.from_coded(self.coded)
+        dense = pivot_votes(self.coded)
+        self.dense = dense.where(dense != 0)
+        agree, total = self.votes.agreement_counts()
+        self.sim = similarity_from_counts(agree, total)
+        self.registry = SenatorRegistry(self.senate.sen_info)
+        self.tmp = tempfile.mkdtemp()
+
+@stage('build_frame_loop', max_size=1, needs='to_csv')
+def bench_build_frame_loop(ctx):
+    return lambda: to_csv.build_frame_loop(ctx.senate.votes)
+
+@stage('encode_pivot')
+def bench_encode_pivot(ctx):
+    return lambda: pivot_votes(encode_votes(ctx.senate.votes))
+
+@stage('vote_matrix')
+def bench_vote_matrix(ctx):
+    return lambda: VoteMatrix.from_coded(encode_votes(ctx.senate.votes))
+
+@stage('similarity_loop', max_size=1, needs='to_csv')
+def bench_similarity_loop(ctx):
+    return lambda: to_csv.similarity_matrix_loop(ctx.dense)
+
+@stage('similarity_dense')
+def bench_similarity_dense(ctx):
+    return lambda: fast_similarity_matrix(ctx.dense)
+
+@stage('similarity_sparse')
+def bench_similarity_sparse(ctx):
+    return lambda: similarity_from_counts(*ctx.votes.agreement_counts())
+
+@stage('refresh_counts_5_new')
+def bench_refresh_counts(ctx):
+    # Counts saved without the last 5 roll calls, as after the previous daily run
+    path = os.path.join(ctx.tmp, 'counts.npz')
+    m = len(ctx.votes.csr_ids)
+    base = update_counts(empty_counts(), ctx.votes.column_range(0, m - 5))
+
+    def run():
+        save_counts(path, base)
+        counts = refresh_counts(path, ctx.votes)
+        return counts_similarity(counts, ctx.votes.senators)
+    return run
+
+@stage('topk_neighbors')
+def bench_topk(ctx):
+    return lambda: topk_neighbors(ctx.sim, ctx.votes.senators, 10)
+
+@stage('pca_kmeans_current', needs='to_csv')
+def bench_pca_kmeans(ctx):
+    current = ctx.votes.congress(116).to_frame(fill=0)
+
+    def run():
+        to_csv.PCA(2).fit_transform(current)
+        to_csv.KMeans(5, n_init=10).fit_predict(current)
+    return run
+
+# Inputs of the sen_data.csv plot frame, the first two senators renamed to the
+# excluded/overridden ones hard coded in the reference
+def plot_inputs(ctx):
+    renames = {ctx.votes.senators[0]: 'Kelly Loeffler', ctx.votes.senators[1]: 'Richard Shelby'}
+    votes = VoteMatrix(
+        [ renames.get(sen, sen) for sen in ctx.votes.senators ], ctx.votes.csr_ids, ctx.votes.scores, ctx.votes.abstain
+    )
+    sen_info = [
+        (sen_id, *renames.get(f'{f_name} {l_name}', f'{f_name} {l_name}').split(' ', 1), party, gender, state)
+        for sen_id, f_name, l_name, party, gender, state in ctx.senate.sen_info
+    ]
+    return votes, sen_info
+
+# Embedding of the plotted senators, fit once outside the timed runs so both
+# sen_data stages time frame assembly only (the fit is timed by the embedding_* stages)
+def plot_embedding(votes):
+    return to_csv.fit_embedding(votes.drop_senators(to_csv.EXCLUDED).congress(116))
+
+@stage('sen_data_loop', needs='to_csv')
+def bench_sen_data_loop(ctx):
+    votes, sen_info = plot_inputs(ctx)
+    df = votes.to_frame()
+    df_current = votes.congress(116).to_frame(fill=0)
+    embedding = plot_embedding(votes)
+    return lambda: to_csv.plot_frame_loop(df, df_current, sen_info, embedding=embedding)
+
+@stage('sen_data_vectorized', needs='to_csv')
+def bench_sen_data_vectorized(ctx):
+    votes, sen_info = plot_inputs(ctx)
+    embedding = plot_embedding(votes)
+
+    def run():
+        kept = votes.drop_senators(to_csv.EXCLUDED)
+        return to_csv.plot_frame(kept.congress(116), kept.voting_length(), sen_info, embedding)
+    return run
+
+@stage('embedding_cold', needs='to_csv')
+def bench_embedding_cold(ctx):
+    current = ctx.votes.congress(116)
+    return lambda: to_csv.fit_embedding(current, pca='randomized')
+
+@stage('embedding_warm_1_new', needs='to_csv')
+def bench_embedding_warm(ctx):
+    # Embedding saved without the last roll call, as after the previous daily run
+    current = ctx.votes.congress(116)
+    m = len(current.csr_ids)
+    previous = to_csv.fit_embedding(current.column_range(0, m - 1), pca='randomized')
+    return lambda: to_csv.fit_embedding(current, previous, pca='randomized')
+
+@stage('embedding_minibatch_all', needs='to_csv')
+def bench_embedding_minibatch(ctx):
+    return lambda: to_csv.fit_embedding(ctx.votes, pca='incremental', kmeans='minibatch')
+
+@stage('embedding_minibatch_all_warm_5_new', needs='to_csv')
+def bench_embedding_minibatch_warm(ctx):
+    m = len(ctx.votes.csr_ids)
+    previous = to_csv.fit_embedding(ctx.votes.column_range(0, m - 5), pca='incremental', kmeans='minibatch')
+    return lambda: to_csv.fit_embedding(ctx.votes, previous, pca='incremental', kmeans='minibatch')
+
+@stage('sen_by_q')
+def bench_sen_by_q(ctx):
+    queries = [ (p, g, s) for p in (None, 'R', ['D', 'ID']) for g in (None, 'F') for s in (None, 'NY', ['CA', 'TX']) ]
+    return lambda: [ ctx.registry.query(p, g, s) for p, g, s in queries ]
+
+@stage('selected_senator_sim', needs='functions')
+def bench_selected_senator_sim(ctx):
+    index = neighbor_index(ctx)
+    return lambda: [ functions.selected_senator_sim(index, sen) for sen in index.senators ]
+
+@stage('sim_plot', needs='functions')
+def bench_sim_plot(ctx):
+    index = neighbor_index(ctx)
+    return lambda: functions.sim_plot(index, index.senators[0])
+
+@stage('pca_plot', needs='functions')
+def bench_pca_plot(ctx):
+    rng = np.random.default_rng(0)
+    names = ctx.registry.names
+    df = pd.DataFrame({
+        'name': names,
+        'party': [ ctx.registry.by_name[name].party for name in names ],
+        'state': [ ctx.registry.by_name[name].state for name in names ],
+        'x': rng.normal(size=len(names)),
+        'y': rng.normal(size=len(names)),
+        'cluster': rng.choice(['A Cluster', 'B Cluster'], len(names)),
+        'voting_length': rng.integers(1, 1000, len(names)),
+    })
+    return lambda: functions.pca_plot(df, ctx.registry, party=['R', 'D'])
+
+def neighbor_index(ctx):
+    senators = ctx.votes.senators
+    most, least = topk_neighbors(ctx.sim, senators, 10)
+    return functions.NeighborIndex(senators, { sen: i for i, sen in enumerate(senators) }, ctx.sim, most, least)
+
+# Function to time func, best of repeat runs
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Function to run every stage at every size
+def run(sizes=SIZES, repeat=3, stages=None):
+    modules = {'to_csv': to_csv, 'functions': functions}
+    results = []
+    for size in sizes:
+        ctx = Context(size)
+        print(f'{size} congress(es): {len(ctx.senate.votes)} votes, {len(ctx.votes.senators)} senators')
+        for name, (build, max_size, needs) in STAGES.items():
+            if stages is not None and name not in stages:
+                continue
+            if max_size is not None and size > max_size:
+                continue
+            record = {'stage': name, 'congresses': size, 'votes': len(ctx.senate.votes)}
+            if needs is not None and modules[needs] is None:
+                record['skipped'] = f'{needs} not importable'
+            else:
+                # Reference loops are slow, time them once
+                record['seconds'] = timed(build(ctx), 1 if max_size is not None else repeat)
+            print(f'  {name}: {record.get("seconds", record.get("skipped"))}')
+            results.append(record)
+    return results
+
+if __name__ == '__main__':
+    # python run.py [SIZE ...]
+    sizes = [ int(arg) for arg in sys.argv[1:] ] or SIZES
+    results = run(sizes)
+    commit = git_commit()
+    output = {
+        'commit': commit,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'results': results,
+    }
+    os.makedirs(os.path.join(HERE, 'results'), exist_ok=True)
+    path = os.path.join(HERE, 'results', f'{datetime.now().strftime("%Y%m%dT%H%M%S")}-{commit}.json')
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'Results written to {path}')
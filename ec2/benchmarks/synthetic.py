@@ -0,0 +1,63 @@
+from collections import namedtuple
+
+import numpy as np
+
+STATES = [
+    'AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 'IN', 'KS', 'KY',
+    'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 'NH', 'NJ', 'NM', 'NV', 'NY',
+    'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VA', 'VT', 'WA', 'WI', 'WV', 'WY',
+]
+
+# Generated senate: votes and sen_info rows shaped like congress_votes() and senator_info(),
+# bills rows like the bills table
+SyntheticSenate = namedtuple('SyntheticSenate', ['votes', 'sen_info', 'bills'])
+
+# Function to generate a seeded synthetic senate
+def synthetic_senate(congresses=1, last_congress=116, roll_calls=550, turnover=0.1,
+                     absence=0.04, present=0.002, party_line=0.7, seed=0):
+    """
+    Each seat holder has an ideal point drawn around their party's mean. A roll
+    call is either a party-line vote (cut point between the parties) or a
+    bipartisan one (cut point anywhere), senators vote yes when left of the cut
+    point with some noise, and are absent (Not Voting) or Present at the given
+    rates. Between congresses a turnover share of seats gets a new senator.
+    """
+    rng = np.random.default_rng(seed)
+    party_mean = {'D': -1.0, 'R': 1.0, 'ID': -0.6}
+
+    sen_info = []
+    def new_senator(state):
+        i = len(sen_info)
+        party = str(rng.choice(['D', 'R', 'ID'], p=[0.48, 0.48, 0.04]))
+        gender = str(rng.choice(['M', 'F'], p=[0.75, 0.25]))
+        sen_info.append((f'S{i:05d}', f'First{i}', f'Last{i}', party, gender, state))
+        return i, party_mean[party] + rng.normal(0, 0.35)
+
+    seats = [ new_senator(state) for state in STATES for _ in range(2) ]
+
+    votes = []
+    bills = []
+    for c in range(last_congress - congresses + 1, last_congress + 1):
+        if c != last_congress - congresses + 1:
+            seats = [ new_senator(sen_info[i][5]) if rng.random() < turnover else (i, x) for i, x in seats ]
+        ids = np.array([ i for i, _ in seats ])
+        ideal = np.array([ x for _, x in seats ])
+        names = np.array([ f'{sen_info[i][1]} {sen_info[i][2]}' for i in ids ], dtype=object)
+
+        for n in range(roll_calls):
+            session = 1 if n < roll_calls // 2 else 2
+            roll_call = n + 1 if session == 1 else n + 1 - roll_calls // 2
+            csr_id = f'{c}.{session}.{roll_call}'
+            bills.append((csr_id, c, session, roll_call, f's{n}-{c}', f'{1787 + 2 * c + session - 1}-06-01'))
+
+            cut = rng.normal(0, 0.3) if rng.random() < party_line else rng.normal(0, 1.5)
+            yes = ideal + rng.normal(0, 0.4, len(ideal)) < cut
+            if rng.random() < 0.5:
+                yes = ~yes
+            draw = rng.random(len(ideal))
+            positions = np.where(yes, 'Yes', 'No').astype(object)
+            positions[draw < absence] = 'Not Voting'
+            positions[draw < present] = 'Present'
+            votes.extend(zip(names, [csr_id] * len(names), positions))
+
+    return SyntheticSenate(votes, sen_info, bills)
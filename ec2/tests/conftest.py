@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Modules are imported by name from their directories, as the scripts run there
+HERE = os.path.dirname(os.path.abspath(__file__))
+for name in ('utils', 'app', 'benchmarks'):
+    sys.path.insert(0, os.path.join(HERE, '..', name))
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agreement_series import pair_prefix_sums
+from functions import PairSeries, rolling_agreement
+from vote_matrix import VoteMatrix
+
+# Seeded yes/no/present votes of 5 senators on 60 roll calls over 20 days
+@pytest.fixture
+def history():
+    rng = np.random.default_rng(3)
+    values = rng.choice([1.0, -1.0, 0.0, np.nan], size=(5, 60), p=[0.45, 0.4, 0.05, 0.1])
+    # Senator 1 and Senator 3 never both vote yes/no in the first 8 days
+    values[1, :24] = np.nan
+    values[3, 12:36] = 0.0
+    senators = [ f'Senator {i}' for i in range(5) ]
+    df = pd.DataFrame(values, index=senators, columns=[ f'116.1.{j}' for j in range(60) ])
+    dates = [ f'2020-01-{day + 1:02d}' for day in range(20) for _ in range(3) ]
+    days, agree, total = pair_prefix_sums(VoteMatrix.from_frame(df), senators, dates)
+    series = PairSeries(senators, { sen: i for i, sen in enumerate(senators) }, days, agree, total)
+    return df, dates, series
+
+# Function to count the shared and agreeing yes/no votes of a pair over each window of days
+def direct_rates(df, dates, sen_a, sen_b, window):
+    days = sorted(set(dates))
+    a, b = df.loc[sen_a].to_numpy(), df.loc[sen_b].to_numpy()
+    rates, shared = [], []
+    for d in range(len(days)):
+        in_window = np.isin(dates, days[max(0, d - window + 1):d + 1])
+        both = in_window & np.isin(a, [1, -1]) & np.isin(b, [1, -1])
+        shared.append(both.sum())
+        rates.append((a[both] == b[both]).sum() / both.sum() if both.sum() else np.nan)
+    return np.array(rates), np.array(shared)
+
+@pytest.mark.parametrize('window', [1, 3, 7, 20])
+@pytest.mark.parametrize('pair', [('Senator 0', 'Senator 2'), ('Senator 3', 'Senator 1'), ('Senator 4', 'Senator 0')])
+def test_rolling_agreement_matches_direct_count(history, pair, window):
+    df, dates, series = history
+    rate, shared = rolling_agreement(series, *pair, window)
+    expected_rate, expected_shared = direct_rates(df, dates, *pair, window)
+    np.testing.assert_array_equal(shared, expected_shared)
+    np.testing.assert_allclose(rate, expected_rate)
+
+def test_window_without_shared_votes_is_nan(history):
+    df, dates, series = history
+    rate, shared = rolling_agreement(series, 'Senator 1', 'Senator 3', 3)
+    assert (shared[:8] == 0).all() and np.isnan(rate[:8]).all()
+    assert not np.isnan(rate[-1])
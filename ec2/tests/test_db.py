@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+from db import STAND_IN_SCHEMA, create_stand_in, migrate, write_batch
+
+BILL = ('116.1.1', 116, 1, 1, 's1-116', '2019-01-03')
+SENATOR = ('S000001', 'First', 'Last', 'D', 'F', 'NY')
+
+def test_migrate_removes_duplicates_then_adds_key():
+    conn = sqlite3.connect(':memory:')
+    # Tables as the old writer left them, without the votes key
+    for statement in STAND_IN_SCHEMA:
+        conn.execute(statement)
+    conn.execute('INSERT INTO bills VALUES (?, ?, ?, ?, ?, ?)', BILL)
+    conn.execute('INSERT INTO senators VALUES (?, ?, ?, ?, ?, ?)', SENATOR)
+    for position in ('Yes', 'Yes', 'No'):
+        conn.execute('INSERT INTO votes VALUES (?, ?, ?)', ('S000001', '116.1.1', position))
+    conn.commit()
+
+    assert migrate(conn) == 2
+    assert conn.execute('SELECT position FROM votes').fetchall() == [('Yes',)]
+    assert migrate(conn) == 0
+    assert write_batch(conn, votes=[('S000001', '116.1.1', 'No')])['votes'] == 0
+
+def test_write_batch_skips_present_rows():
+    conn = sqlite3.connect(':memory:')
+    create_stand_in(conn)
+    rows = {'bills': [BILL], 'senators': [SENATOR], 'votes': [('S000001', '116.1.1', 'Yes')]}
+    assert write_batch(conn, **rows) == {'bills': 1, 'senators': 1, 'votes': 1}
+    assert write_batch(conn, **rows) == {'bills': 0, 'senators': 0, 'votes': 0}
+
+def test_write_batch_needs_votes_key():
+    conn = sqlite3.connect(':memory:')
+    for statement in STAND_IN_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    with pytest.raises(RuntimeError, match='migrate'):
+        write_batch(conn, bills=[BILL], senators=[SENATOR], votes=[('S000001', '116.1.1', 'Yes')])
+    # Nothing of the batch is left behind
+    assert conn.execute('SELECT COUNT(*) FROM bills').fetchone() == (0,)
+    # Batches without votes do not need it
+    write_batch(conn, bills=[BILL])
+    migrate(conn)
+    write_batch(conn, senators=[SENATOR], votes=[('S000001', '116.1.1', 'Yes')])
+    assert conn.execute('SELECT COUNT(*) FROM votes').fetchone() == (1,)
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import run
+from embedding import fit_embedding, refresh_embedding
+from synthetic import synthetic_senate
+from vote_matrix import VoteMatrix
+from votes import encode_votes
+
+@pytest.fixture(scope='module')
+def votes():
+    return VoteMatrix.from_coded(encode_votes(synthetic_senate(2, roll_calls=120, seed=5).votes))
+
+@pytest.mark.parametrize('pca', ['randomized', 'incremental'])
+def test_warm_components_match_exact_pca(votes, pca):
+    m = len(votes.csr_ids)
+    previous = fit_embedding(votes.column_range(0, m - 5), pca=pca)
+    warm = fit_embedding(votes, previous, pca=pca)
+    exact = fit_embedding(votes, pca='full')
+    signs = np.sign((warm.components * exact.components).sum(axis=1))
+    np.testing.assert_allclose(warm.xy, exact.xy * signs, atol=1e-4 * np.abs(exact.xy).max())
+
+def test_refresh_skips_unchanged_votes(votes, tmp_path):
+    path = str(tmp_path / 'embedding.npz')
+    first = refresh_embedding(path, votes, pca='randomized')
+    stamp = os.stat(path).st_mtime_ns
+    again = refresh_embedding(path, votes, pca='randomized')
+    assert os.stat(path).st_mtime_ns == stamp
+    np.testing.assert_array_equal(again.labels, first.labels)
+    # New settings refit
+    refresh_embedding(path, votes, pca='incremental', kmeans='minibatch')
+    assert os.stat(path).st_mtime_ns != stamp
+
+def test_plot_frame_matches_loop_on_the_same_embedding():
+    # Both sen_data benchmark stages, ties on voting_length included
+    ctx = run.Context(1)
+    loop = run.bench_sen_data_loop(ctx)()
+    vectorized = run.bench_sen_data_vectorized(ctx)()
+    columns = ['name', 'party', 'gender', 'state', 'x', 'y', 'label', 'voting_length', 'cluster']
+    loop = loop[columns].sort_values('name').reset_index(drop=True)
+    vectorized = vectorized[columns].sort_values('name').reset_index(drop=True)
+    pd.testing.assert_frame_equal(loop, vectorized, check_dtype=False)
@@ -0,0 +1,89 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fetch import Fetcher, DailyQuota, QuotaExceeded
+
+# Stub server: /ok/<n> answers {"n": n}, /flaky/<status>/<k> fails k times with
+# status (Retry-After: 0) before answering, /down always answers 503
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+        parts = self.path.strip('/').split('/')
+        if parts[0] == 'flaky' and hits <= int(parts[2]):
+            self.reply(int(parts[1]), {'Retry-After': '0'})
+        elif parts[0] == 'down':
+            self.reply(503)
+        else:
+            self.reply(200, body={'n': parts[-1]})
+
+    def reply(self, status, headers=None, body=None):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.hits = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def fetcher(**kwargs):
+    kwargs.setdefault('rate', 1000)
+    kwargs.setdefault('backoff', 0)
+    return Fetcher(**kwargs)
+
+def test_get_many_keeps_order(server):
+    f = fetcher(max_workers=4)
+    urls = [ f'{server.url}/ok/{n}' for n in range(20) ]
+    assert f.get_many(urls) == [ {'n': str(n)} for n in range(20) ]
+    f.close()
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_retries_with_retry_after(server, status):
+    f = fetcher(retries=3)
+    assert f.get_json(f'{server.url}/flaky/{status}/2') == {'n': '2'}
+    assert server.hits[f'/flaky/{status}/2'] == 3
+    f.close()
+
+def test_gives_up_after_retries(server):
+    f = fetcher(retries=2)
+    with pytest.raises(requests.HTTPError):
+        f.get(f'{server.url}/down')
+    assert server.hits['/down'] == 3
+    assert f.get_many([f'{server.url}/down', f'{server.url}/ok/1'], skip_errors=True) == [None, {'n': '1'}]
+    f.close()
+
+def test_daily_quota(server, tmp_path):
+    path = str(tmp_path / 'quota.json')
+    f = fetcher(quota=DailyQuota(3, path))
+    assert f.get_json(f'{server.url}/ok/1') == {'n': '1'}
+    # Retries count against the quota too
+    with pytest.raises(QuotaExceeded):
+        f.get(f'{server.url}/flaky/503/5')
+    f.close()
+    # The count is shared with later runs, skip_errors does not hide it
+    f = fetcher(quota=DailyQuota(3, path))
+    with pytest.raises(QuotaExceeded):
+        f.get_many([f'{server.url}/ok/2'], skip_errors=True)
+    f.close()
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+from datetime import date
+
+from http_cache import DiskCache, default_ttl, OPEN_TTL, RECENT_TTL
+from propublica import vote_menu_url, senate_members_url, roll_call_url, recent_votes_url
+
+def test_open_session_expires():
+    day = date(2020, 5, 1)
+    assert default_ttl(vote_menu_url(116, 2), day) == OPEN_TTL
+    assert default_ttl(senate_members_url(116), day) == OPEN_TTL
+    assert default_ttl(recent_votes_url(), day) == RECENT_TTL
+
+def test_closed_sessions_are_permanent():
+    day = date(2020, 5, 1)
+    assert default_ttl(vote_menu_url(116, 1), day) is None
+    assert default_ttl(senate_members_url(115), day) is None
+    assert default_ttl(roll_call_url(116, 2, 5), day) is None
+
+def test_session_running_into_january():
+    assert default_ttl(vote_menu_url(116, 2), date(2021, 1, 2)) == OPEN_TTL
+    assert default_ttl(vote_menu_url(116, 2), date(2021, 2, 1)) is None
+
+def age(cache, url, seconds):
+    # Move the entry's last use back in time
+    stamp = time.time() - seconds
+    os.utime(cache.file(url), (stamp, stamp))
+
+def test_evicts_least_recently_used_down_to_90_percent(tmp_path):
+    body = b'x' * 1000
+    cache = DiskCache(str(tmp_path), max_bytes=10 ** 9, ttl=lambda url: None)
+    urls = [ f'https://example.com/{i}.json' for i in range(10) ]
+    for i, url in enumerate(urls):
+        cache.put(url, body)
+        age(cache, url, 100 - i)
+    entry = os.path.getsize(cache.file(urls[0]))
+
+    cache.max_bytes = 8 * entry
+    cache.put('https://example.com/new.json', body)
+    kept = [ url for url in urls if os.path.exists(cache.file(url)) ]
+    # 11 entries over a max of 8, the oldest go until at most 7.2 are left
+    assert kept == urls[-6:]
+    assert cache.size <= 0.9 * cache.max_bytes
+    assert cache.size == sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+
+def test_get_refreshes_recency(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=lambda url: None)
+    for i in range(3):
+        cache.put(f'https://example.com/{i}.json', b'body')
+        age(cache, f'https://example.com/{i}.json', 100 - i)
+    assert cache.get('https://example.com/0.json') == (b'body', None)
+    entry = os.path.getsize(cache.file('https://example.com/0.json'))
+    cache.max_bytes = 3 * entry
+    cache.put('https://example.com/3.json', b'body')
+    assert os.path.exists(cache.file('https://example.com/0.json'))
+    assert not os.path.exists(cache.file('https://example.com/1.json'))
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=lambda url: 60)
+    cache.put('https://example.com/a.json', b'body', 'utf-8')
+    assert cache.get('https://example.com/a.json') == (b'body', 'utf-8')
+    path = cache.file('https://example.com/a.json')
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        body = f.read()
+    header['stored'] -= 61
+    with open(path, 'wb') as f:
+        f.write(json.dumps(header).encode() + b'\n' + body)
+    assert cache.get('https://example.com/a.json') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_url_mismatch_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=lambda url: None)
+    cache.put('https://example.com/a.json', b'body')
+    # Another url's entry under a.json's file name (a hash collision)
+    os.replace(cache.file('https://example.com/a.json'), cache.file('https://example.com/b.json'))
+    assert cache.get('https://example.com/b.json') is None
+    assert cache.stats()['misses'] == 1
+
+def test_evict_skips_entries_removed_meanwhile(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_bytes=10 ** 9, ttl=lambda url: None)
+    for i in range(4):
+        cache.put(f'https://example.com/{i}.json', b'x' * 100)
+        age(cache, f'https://example.com/{i}.json', 100 - i)
+    remove = os.remove
+
+    # Another process removed the oldest entry between the scan and the remove
+    def racing_remove(path):
+        remove(path)
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(os, 'remove', racing_remove)
+    cache.max_bytes = 2 * os.path.getsize(cache.file('https://example.com/0.json'))
+    cache.put('https://example.com/4.json', b'x' * 100)
+    assert cache.size == sum(entry.stat().st_size for entry in os.scandir(tmp_path))
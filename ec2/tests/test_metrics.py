@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+from metrics import CallbackMetrics, collect_dir, empty_histogram, observe, ARCHIVE, LATENCY_BUCKETS, SIZE_BUCKETS
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def worker_file(path, pid, start, calls, errors=0):
+    latency = empty_histogram(LATENCY_BUCKETS)
+    for _ in range(calls):
+        observe(latency, LATENCY_BUCKETS, 0.01)
+    callbacks = {'plot|graph.figure': {
+        'callback': 'plot', 'output': 'graph.figure', 'latency': latency,
+        'size': empty_histogram(SIZE_BUCKETS), 'errors': errors,
+    }}
+    with open(os.path.join(path, f'worker-{pid}-{start}.json'), 'w') as f:
+        json.dump(callbacks, f)
+
+def calls(total):
+    return total['plot|graph.figure']['latency']['count']
+
+def test_callbacks_do_not_write_on_the_request_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'FLUSH_INTERVAL', 3600)
+    recorder = CallbackMetrics(str(tmp_path))
+
+    def plot():
+        return 1
+    timed = recorder.wrap(plot, 'graph.figure')
+    for _ in range(3):
+        timed()
+    assert not [ name for name in os.listdir(tmp_path) if name.startswith('worker-') ]
+
+    recorder.close()
+    assert not recorder.thread.is_alive()
+    assert calls(collect_dir(str(tmp_path))) == 3
+
+def test_exited_workers_are_folded_and_totals_never_drop(tmp_path):
+    path = str(tmp_path)
+    pid = exited_pid()
+    worker_file(path, pid, 1, calls=4, errors=1)
+    worker_file(path, os.getpid(), 2, calls=2)
+    assert calls(collect_dir(path)) == 6
+    assert sorted(os.listdir(path)) == sorted([ARCHIVE, 'archive.lock', f'worker-{os.getpid()}-2.json'])
+
+    # The pid reused by a worker that has exited again starts a new file
+    worker_file(path, pid, 3, calls=1)
+    total = collect_dir(path)
+    assert calls(total) == 7
+    assert total['plot|graph.figure']['errors'] == 1
+    assert calls(collect_dir(path)) == 7
+
+def test_interrupted_fold_is_not_counted_twice(tmp_path):
+    path = str(tmp_path)
+    pid = exited_pid()
+    worker_file(path, pid, 1, calls=4)
+    collect_dir(path)
+    # As if the fold stopped after writing the archive, before removing the file
+    worker_file(path, pid, 1, calls=4)
+    assert calls(collect_dir(path)) == 4
+    assert not os.path.exists(os.path.join(path, f'worker-{pid}-1.json'))
@@ -0,0 +1,95 @@
+import logging
+import os
+import sqlite3
+import tarfile
+
+import pytest
+
+from db import create_stand_in, write_batch
+from ingest_xml import ingest_db
+from propublica import is_bill_vote
+from senate_xml import MemberIds, parse_vote, read_votes
+
+# Five roll calls of 116th congress: a bill (S. 47), a nomination, a treaty, a joint
+# resolution (H.J.Res. 31) and a file cut off before the vote number
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'senate_xml')
+
+# senators table rows (sen_id, f_name, l_name, state), Carl Gray (VT) is missing
+SENATORS = [
+    ('S000001', 'Ann', 'Smith', 'MN'),
+    ('S000002', 'Tina', 'Smith', 'MN'),
+    ('J000003', 'Bob', 'Jones', 'TX'),
+]
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+def test_positions_use_propublica_wording():
+    vote = parse_vote(fixture('vote_116_1_00001.xml'))
+    assert (vote['congress'], vote['session'], vote['roll_call']) == (116, 1, 1)
+    assert vote['bill_id'] == 's47-116'
+    assert vote['date'] == '2019-01-03'
+    assert [ (p['member_id'], p['vote_position']) for p in vote['positions'] ] == [
+        ('S001', 'Yes'), ('S002', 'No'), ('S003', 'Not Voting'), ('S004', 'Present'),
+    ]
+
+def test_nominations_and_treaties_are_not_bill_votes():
+    nomination = parse_vote(fixture('vote_116_1_00002.xml'))
+    treaty = parse_vote(fixture('vote_116_1_00003.xml'))
+    resolution = parse_vote(fixture('vote_116_1_00004.xml'))
+    assert nomination['bill_id'] is None and not is_bill_vote(nomination)
+    assert treaty['bill_id'] is None and not is_bill_vote(treaty)
+    assert resolution['bill_id'] == 'hjres31-116' and is_bill_vote(resolution)
+
+def test_directory_and_tarball_give_the_same_votes(tmp_path, caplog):
+    archive = str(tmp_path / 'votes.tar.gz')
+    with tarfile.open(archive, 'w:gz') as tar:
+        tar.add(FIXTURES, arcname='116')
+    with caplog.at_level(logging.WARNING, logger='senate_xml'):
+        from_dir = list(read_votes(FIXTURES))
+        from_tar = list(read_votes(archive))
+    assert [ vote['roll_call'] for vote in from_dir ] == [1, 2, 3, 4]
+    assert from_tar == from_dir
+    # The cut off file is skipped in both
+    assert sum('vote_116_1_00005.xml' in message for message in caplog.messages) == 2
+
+def test_member_ids_break_ties_on_first_name():
+    ids = MemberIds(SENATORS)
+    vote = ids.apply(parse_vote(fixture('vote_116_1_00001.xml')))
+    assert [ (p['member_id'], p['vote_position']) for p in vote['positions'] ] == [
+        ('S000001', 'Yes'), ('S000002', 'No'), ('J000003', 'Not Voting'),
+    ]
+    assert ids.unresolved == {'S004': 'Carl Gray (VT)'}
+
+def test_member_ids_keep_ambiguous_members_unresolved():
+    # Both first names match Ann, an explicit mapping is needed
+    ids = MemberIds(SENATORS + [('S000004', 'Anne', 'Smith', 'MN')])
+    vote = ids.apply(parse_vote(fixture('vote_116_1_00001.xml')))
+    assert 'S001' in ids.unresolved
+    assert 'S000001' not in [ p['member_id'] for p in vote['positions'] ]
+
+    ids = MemberIds(SENATORS + [('S000004', 'Anne', 'Smith', 'MN')], id_map={'S001': 'S000001'})
+    vote = ids.apply(parse_vote(fixture('vote_116_1_00001.xml')))
+    assert vote['positions'][0] == {'member_id': 'S000001', 'vote_position': 'Yes'}
+    assert 'S001' not in ids.unresolved
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    create_stand_in(conn)
+    write_batch(conn, senators=[ (sen_id, f_name, l_name, 'D', 'F', state) for sen_id, f_name, l_name, state in SENATORS ])
+    yield conn
+    conn.close()
+
+def test_ingest_db_writes_bill_votes_and_logs_unresolved(conn, caplog):
+    with caplog.at_level(logging.WARNING, logger='ingest_xml'):
+        ingest_db(conn, FIXTURES)
+    cursor = conn.cursor()
+    cursor.execute('SELECT csr_id, bill_id FROM bills ORDER BY csr_id')
+    assert cursor.fetchall() == [('116.1.1', 's47-116'), ('116.1.4', 'hjres31-116')]
+    cursor.execute('SELECT sen_id, csr_id, position FROM votes ORDER BY csr_id, sen_id')
+    assert cursor.fetchall() == [
+        ('J000003', '116.1.1', 'Not Voting'), ('S000001', '116.1.1', 'Yes'), ('S000002', '116.1.1', 'No'),
+        ('J000003', '116.1.4', 'No'), ('S000001', '116.1.4', 'Yes'), ('S000002', '116.1.4', 'Yes'),
+    ]
+    assert 'Unresolved member S004: Carl Gray (VT)' in caplog.messages
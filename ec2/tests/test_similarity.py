@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from similarity import (
+    fast_similarity_matrix, refresh_counts, update_counts, empty_counts, save_counts, load_counts
+)
+from synthetic import synthetic_senate
+from to_csv import similarity_matrix_loop
+from vote_matrix import VoteMatrix
+from votes import encode_votes
+
+# Seeded senator x bill score frame with yes/no (1/-1), not voting/present (0) and missing (NaN)
+def score_frame(senators, bills, seed, missing=0.2):
+    rng = np.random.default_rng(seed)
+    values = rng.choice([1.0, -1.0, 0.0], size=(senators, bills), p=[0.45, 0.45, 0.1])
+    values[rng.random((senators, bills)) < missing] = np.nan
+    return pd.DataFrame(
+        values,
+        index=[ f'Senator {i}' for i in range(senators) ],
+        columns=[ f'116.1.{j}' for j in range(bills) ],
+    )
+
+@pytest.mark.parametrize('seed', range(5))
+def test_fast_similarity_matches_loop(seed):
+    df = score_frame(12, 40, seed)
+    np.testing.assert_array_equal(fast_similarity_matrix(df), similarity_matrix_loop(df))
+
+def test_pairs_without_shared_votes():
+    df = score_frame(6, 30, 7)
+    # Senator 0 votes only on the first half, Senator 1 only on the second
+    df.iloc[0, 15:] = np.nan
+    df.iloc[1, :15] = np.nan
+    sim = fast_similarity_matrix(df)
+    assert np.isnan(sim[0, 1]) and np.isnan(sim[1, 0])
+    # The loop divides by zero for such pairs, compare the others
+    expected = similarity_matrix_loop(df.drop(index=['Senator 0', 'Senator 1']))
+    np.testing.assert_array_equal(sim[2:, 2:], expected)
+
+def test_only_zero_votes():
+    df = score_frame(5, 20, 3, missing=0.0)
+    df.iloc[4] = 0.0
+    np.testing.assert_array_equal(fast_similarity_matrix(df), similarity_matrix_loop(df))
+
+# Agreement counts of VoteMatrix rows, reordered to the senators of counts
+def full_counts(votes, senators):
+    agree, total = votes.agreement_counts()
+    position = { sen: i for i, sen in enumerate(votes.senators) }
+    rows = np.array([ position[sen] for sen in senators ])
+    return agree[np.ix_(rows, rows)], total[np.ix_(rows, rows)]
+
+def assert_counts_equal(counts, votes):
+    agree, total = full_counts(votes, counts.senators)
+    assert np.array_equal(counts.agree, agree)
+    assert np.array_equal(counts.total, total)
+    assert counts.csr_ids == votes.csr_ids
+
+@pytest.fixture
+def history():
+    return VoteMatrix.from_coded(encode_votes(synthetic_senate(2, roll_calls=80, turnover=0.2, seed=11).votes))
+
+def test_counts_over_appended_batches(history, tmp_path):
+    path = str(tmp_path / 'counts.npz')
+    m = len(history.csr_ids)
+    for stop in (10, 11, 60, 90, m):
+        counts = refresh_counts(path, history.column_range(0, stop))
+    assert_counts_equal(counts, history)
+    assert_counts_equal(load_counts(path), history)
+
+def test_counts_after_recast_vote(history, tmp_path):
+    path = str(tmp_path / 'counts.npz')
+    refresh_counts(path, history)
+    # A yes/no position changed on a bill already counted
+    scores = history.scores.tolil()
+    i, j = next(zip(*scores.nonzero()))
+    scores[i, j] = -scores[i, j]
+    recast = VoteMatrix(history.senators, history.csr_ids, scores.tocsr(), history.abstain)
+    assert_counts_equal(refresh_counts(path, recast), recast)
+
+def test_counts_out_of_sync_file_rebuilt(history, tmp_path):
+    path = str(tmp_path / 'counts.npz')
+    # Counts of other votes, over a roll call the history does not have
+    other = VoteMatrix.from_coded(encode_votes([('Someone Else', '999.1.1', 'Yes')]))
+    save_counts(path, update_counts(empty_counts(), other))
+    assert_counts_equal(refresh_counts(path, history), history)
+    # Counts saved before checksums were kept (here also off by one) are rebuilt too
+    counts = load_counts(path)
+    np.savez(
+        path, senators=np.array(counts.senators, dtype=str), csr_ids=np.array(counts.csr_ids, dtype=str),
+        agree=counts.agree + 1, total=counts.total,
+    )
+    assert_counts_equal(refresh_counts(path, history), history)
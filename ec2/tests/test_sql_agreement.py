@@ -0,0 +1,46 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from db import create_stand_in, write_batch
+from similarity import counts_similarity, similarity_from_counts
+from sql_agreement import sql_agreement_counts
+from synthetic import synthetic_senate
+from to_csv import similarity_matrix
+from vote_matrix import VoteMatrix
+from votes import encode_votes, pivot_votes
+
+@pytest.fixture(scope='module')
+def senate():
+    senate = synthetic_senate(2, roll_calls=60, seed=3)
+    conn = sqlite3.connect(':memory:')
+    create_stand_in(conn)
+    sen_ids = { f'{row[1]} {row[2]}': row[0] for row in senate.sen_info }
+    write_batch(
+        conn,
+        bills=senate.bills,
+        senators=senate.sen_info,
+        votes=[ (sen_ids[name], csr_id, position) for name, csr_id, position in senate.votes ],
+    )
+    yield senate, conn
+    conn.close()
+
+@pytest.mark.parametrize('congress', [None, 116])
+def test_sql_counts_match_python(senate, congress):
+    senate, conn = senate
+    votes = VoteMatrix.from_coded(encode_votes(senate.votes))
+    if congress is not None:
+        votes = votes.congress(congress)
+    votes = votes.select(senators=votes.active_senators())
+
+    counts = sql_agreement_counts(conn, congress)
+    assert sorted(counts.senators) == sorted(votes.senators)
+    sim = counts_similarity(counts, votes.senators)
+
+    # Python path of to_csv (sparse counts), and the dense builder with not voting as missing
+    np.testing.assert_array_equal(sim, similarity_from_counts(*votes.agreement_counts()))
+    members, bills = set(votes.senators), set(votes.csr_ids)
+    dense = pivot_votes(encode_votes([ row for row in senate.votes if row[0] in members and row[1] in bills ]))
+    dense = dense.where(dense != 0).loc[votes.senators]
+    np.testing.assert_array_equal(sim, similarity_matrix(dense))
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from db import create_stand_in, write_batch
+from synthetic import synthetic_senate
+from vote_store import VoteStore
+from votes import pivot_votes, stream_coded_votes
+
+# Synthetic senate of 2 congresses with votes keyed by sen_id, as given to write_batch
+@pytest.fixture
+def senate():
+    senate = synthetic_senate(2, roll_calls=30, seed=4)
+    sen_ids = { f'{row[1]} {row[2]}': row[0] for row in senate.sen_info }
+    votes = [ (sen_ids[name], csr_id, position) for name, csr_id, position in senate.votes ]
+    return senate.bills, senate.sen_info, votes
+
+def frame(coded):
+    # Senator x bill scores in a fixed order, to compare reads in any row order
+    df = pivot_votes(coded)
+    return df.sort_index().sort_index(axis=1).astype(float)
+
+def expected_frame(senators, votes):
+    names = { row[0]: f'{row[1]} {row[2]}' for row in senators }
+    rows = pd.DataFrame([ (names[sen_id], csr_id, position) for sen_id, csr_id, position in votes ],
+                        columns=['name', 'csr_id', 'position'])
+    rows['score'] = rows['position'].map({'Yes': 1, 'No': -1, 'Present': 0, 'Not Voting': 0})
+    df = rows.pivot(index='name', columns='csr_id', values='score')
+    df.index.name = None
+    df.columns.name = None
+    return df.sort_index().sort_index(axis=1).astype(float)
+
+def test_append_and_read(tmp_path, senate):
+    bills, senators, votes = senate
+    store = VoteStore(str(tmp_path))
+    added = store.append(bills=bills, senators=senators, votes=votes)
+    assert added == {'bills': len(bills), 'senators': len(senators), 'votes': len(votes)}
+    assert store.congresses() == sorted({ row[1] for row in bills })
+    pd.testing.assert_frame_equal(frame(store.read()), expected_frame(senators, votes), check_names=False)
+
+def test_append_twice_adds_nothing(tmp_path, senate):
+    bills, senators, votes = senate
+    store = VoteStore(str(tmp_path))
+    store.append(bills=bills, senators=senators, votes=votes)
+    before = frame(store.read())
+    assert store.append(bills=bills, senators=senators, votes=votes) == {'bills': 0, 'senators': 0, 'votes': 0}
+    pd.testing.assert_frame_equal(frame(store.read()), before)
+
+def test_late_votes_on_stored_bills_are_added(tmp_path, senate):
+    bills, senators, votes = senate
+    late_sen = senators[0][0]
+    early = [ vote for vote in votes if vote[0] != late_sen ]
+    late = [ vote for vote in votes if vote[0] == late_sen ]
+    store = VoteStore(str(tmp_path))
+    store.append(bills=bills, senators=senators, votes=early)
+
+    # A position cast again for a stored pair keeps the first one, like ON CONFLICT DO NOTHING
+    sen_id, csr_id, position = early[0]
+    recast = (sen_id, csr_id, 'No' if position == 'Yes' else 'Yes')
+    added = store.append(votes=late + [recast] + late)
+    assert added['votes'] == len(late)
+    pd.testing.assert_frame_equal(frame(store.read()), expected_frame(senators, votes), check_names=False)
+
+def test_read_opens_only_the_parts_of_the_congresses(tmp_path, senate):
+    bills, senators, votes = senate
+    store = VoteStore(str(tmp_path))
+    store.append(bills=bills, senators=senators, votes=votes)
+    first, last = store.congresses()
+    expected = frame(store.read()).filter(like=f'{first}.', axis=1).dropna(how='all')
+
+    # Reading one congress does not need the other's files
+    shutil.rmtree(os.path.join(str(tmp_path), f'congress={last}'))
+    result = frame(store.read(congresses=[first]))
+    pd.testing.assert_frame_equal(result, expected)
+    assert all(csr_id.startswith(f'{first}.') for csr_id in result.columns)
+
+def test_import_db_reads_like_the_database(tmp_path, senate):
+    bills, senators, votes = senate
+    conn = sqlite3.connect(':memory:')
+    create_stand_in(conn)
+    write_batch(conn, bills=bills, senators=senators, votes=votes)
+
+    store = VoteStore(str(tmp_path))
+    added = store.import_db(conn, batch_size=len(votes) // 5)
+    assert added['votes'] == len(votes)
+    pd.testing.assert_frame_equal(frame(store.read()), frame(stream_coded_votes(conn)))
+    conn.close()
@@ -0,0 +1,75 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from db import create_stand_in, write_batch
+from synthetic import synthetic_senate
+from to_csv import build_frame_loop
+from vote_matrix import VoteMatrix
+from votes import encode_votes, pivot_votes, stream_coded_votes, NAMES_QUERY
+
+def test_pivot_matches_loop_builder():
+    rows = synthetic_senate(1, roll_calls=30, seed=1).votes
+    rng = np.random.default_rng(1)
+    # Leave some cells without a vote
+    rows = [ row for row, keep in zip(rows, rng.random(len(rows)) > 0.1) if keep ]
+    expected = build_frame_loop(rows)
+    result = pivot_votes(encode_votes(rows))
+    assert list(result.index) == list(expected.index)
+    assert list(result.columns) == list(expected.columns)
+    np.testing.assert_array_equal(result.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+def test_first_appearance_order():
+    rows = [
+        ('B Senator', '116.1.2', 'Yes'),
+        ('A Senator', '116.1.1', 'No'),
+        ('B Senator', '116.1.1', 'Not Voting'),
+        ('C Senator', '116.1.3', 'Present'),
+    ]
+    expected = build_frame_loop(rows)
+    result = pivot_votes(encode_votes(rows))
+    pd.testing.assert_frame_equal(result.astype(float), expected.astype(float))
+
+# Old path: names joined in SQL, read with pd.read_sql and pivoted to scores
+OLD_VOTES_QUERY = """
+    SELECT COALESCE(senators.f_name, '') || ' ' || COALESCE(senators.l_name, '') AS name,
+        votes.csr_id, votes.position
+    FROM votes
+    JOIN bills ON votes.csr_id = bills.csr_id
+    JOIN senators ON votes.sen_id = senators.sen_id
+    ;
+    """
+
+def test_streamed_votes_match_read_sql_pivot():
+    senate = synthetic_senate(2, roll_calls=40, seed=2)
+    conn = sqlite3.connect(':memory:')
+    create_stand_in(conn)
+    sen_ids = { f'{row[1]} {row[2]}': row[0] for row in senate.sen_info }
+    votes = [ (sen_ids[name], csr_id, position) for name, csr_id, position in senate.votes ]
+    write_batch(conn, bills=senate.bills, senators=senate.sen_info, votes=votes)
+
+    # Several fetchmany batches
+    coded = stream_coded_votes(conn, batch_size=len(votes) // 7)
+    result = pivot_votes(coded)
+
+    rows = pd.read_sql(OLD_VOTES_QUERY, conn)
+    rows['score'] = rows['position'].map({'Yes': 1, 'No': -1, 'Present': 0, 'Not Voting': 0})
+    expected = rows.pivot(index='name', columns='csr_id', values='score')
+    expected = expected.reindex(index=result.index, columns=result.columns)
+    assert sorted(result.index) == sorted(rows['name'].unique())
+    assert sorted(result.columns) == sorted(rows['csr_id'].unique())
+    np.testing.assert_array_equal(result.to_numpy(dtype=float), expected.to_numpy(dtype=float))
+
+    matrix = VoteMatrix.from_coded(coded)
+    np.testing.assert_array_equal(
+        matrix.to_frame().reindex(index=result.index, columns=result.columns).to_numpy(),
+        result.where(result != 0).to_numpy(),
+    )
+    conn.close()
+
+def test_names_keep_the_other_part_when_one_is_null():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE senators (sen_id TEXT, f_name TEXT, l_name TEXT)')
+    conn.executemany('INSERT INTO senators VALUES (?, ?, ?)', [('A', 'Ann', None), ('B', None, 'Bee')])
+    assert dict(conn.execute(NAMES_QUERY).fetchall()) == {'A': 'Ann ', 'B': ' Bee'}
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Function to group chronologically ordered columns by vote day
+def vote_days(dates):
+    """
+    Returns the days and the first column of each (consecutive columns with the
+    same date form one day)
+    """
+    dates = np.asarray(dates, dtype=object)
+    if len(dates) == 0:
+        return [], np.array([], dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+    return list(dates[starts]), starts
+
+# Function to build cumulative agreement and co-vote counts of every senator pair by vote day
+def pair_prefix_sums(votes, senators, dates):
+    """
+    votes is a VoteMatrix, dates the date of each of its columns. Returns
+    (days, agree, total) where agree/total are (pairs, days + 1) arrays, row
+    bundle.pair_position(i, j, n) holds the counts of senators[i] and senators[j] summed
+    up to the end of each day (column 0 is 0). Counts between days a and b
+    are agree[:, b + 1] - agree[:, a], with no pass over the votes.
+    """
+    n = len(senators)
+    iu, ju = np.triu_indices(n, k=1)
+    days, starts = vote_days(dates)
+    dtype = np.uint16 if votes.shape[1] < np.iinfo(np.uint16).max else np.uint32
+    agree = np.zeros((len(iu), len(days) + 1), dtype=dtype)
+    total = np.zeros((len(iu), len(days) + 1), dtype=dtype)
+    if len(days) == 0:
+        return days, agree, total
+
+    block = votes.select(senators=senators)
+    bounds = list(starts) + [votes.shape[1]]
+    # One day at a time in chunks of columns, so only pairs x chunk booleans are dense
+    chunk_days = max(1, 2 ** 22 // max(len(iu), 1) // max(votes.shape[1] // len(days), 1))
+    for first in range(0, len(days), chunk_days):
+        last = min(first + chunk_days, len(days))
+        cols = block.column_range(bounds[first], bounds[last]).scores.toarray()
+        yes = cols == 1
+        no = cols == -1
+        cast = yes | no
+        day_starts = np.array(bounds[first:last]) - bounds[first]
+        same = (yes[iu] & yes[ju]) | (no[iu] & no[ju])
+        both = cast[iu] & cast[ju]
+        agree[:, first + 1:last + 1] = np.add.reduceat(same, day_starts, axis=1)
+        total[:, first + 1:last + 1] = np.add.reduceat(both, day_starts, axis=1)
+    np.cumsum(agree, axis=1, out=agree)
+    np.cumsum(total, axis=1, out=total)
+    return days, agree, total
@@ -1,11 +1,12 @@
-import requests
-import json
 import configparser
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from datetime import datetime
 
-import pickle
+from http_cache import DiskCache
+from propublica import api_key, propublica_fetcher, recent_votes_url, roll_call_url, member_url, member_row
+from db import write_batch
+from vote_store import VoteStore
 
 # Set up connection to AWS RDS
 config1 = configparser.ConfigParser()
@@ -50,14 +51,8 @@ if __name__ == '__main__':
     sen_ids = [ sen[0] for sen in sen_ids ]
 
     # Make API call to ProPublica for 20 most recent votes
-    config2 = configparser.ConfigParser()
-    config2.read('../config.ini')
-    api_key = config2.get('propublica', 'PROPUBLICA_API_KEY')
-    r = requests.get(
-        'https://api.propublica.org/congress/v1/senate/votes/recent.json',
-        headers={'X-API-Key': api_key}
-    )
-    votes = r.json()['results']['votes']
+    fetcher = propublica_fetcher(api_key(), cache=DiskCache())
+    votes = fetcher.get_json(recent_votes_url())['results']['votes']
     most_recent = (votes[0]['congress'], votes[0]['session'], votes[0]['roll_call'])
     print(most_recent)
 
@@ -76,15 +71,9 @@ if __name__ == '__main__':
                 rcs_to_pull.append((congress, session, rc))
         print(rcs_to_pull)
 
-        # Make API calls
-        list_of_bills = []
-        for bill in rcs_to_pull:
-            r = requests.get(
-                f'https://api.propublica.org/congress/v1/{bill[0]}/senate/sessions/{bill[1]}/votes/{bill[2]}.json',
-                headers={'X-API-Key': api_key}
-            )
-            results = r.json()['results']
-            list_of_bills.append(results)
+        # Make API calls (concurrent, results in order of rcs_to_pull)
+        responses = fetcher.get_many([ roll_call_url(*bill) for bill in rcs_to_pull ])
+        list_of_bills = [ r['results'] for r in responses ]
 
         # Convert results to dictionaries to be inserted into database
         bill_to_db = []
@@ -140,63 +129,27 @@ if __name__ == '__main__':
 
     # Get senator data from API
     sen_dicts = []
-    for mem in members_to_add:
-        r = requests.get(
-                f'https://api.propublica.org/congress/v1/members/{mem}.json',
-                headers={'X-API-Key': api_key}
-            )
-        results = r.json()['results']
-
-    # Using function from scraping notebook
-    def get_senators(members):
-        senators = []
-        for member in members:
-            senator = (
-                member['id'],
-                member['first_name'],
-                member['last_name'],
-                member['party'],
-                member['gender'],
-                member['state'],
-            )
-            senators.append(senator)
-        return senators
-
-    new_sens = get_senators(sen_dicts)
+    for r in fetcher.get_many([ member_url(mem) for mem in members_to_add ]):
+        sen_dicts.append(r['results'][0])
+    fetcher.close()
+
+    new_sens = [ member_row(member) for member in sen_dicts ]
     if len(new_sens) != 0:
         update_sen = True
     else:
         update_sen = False
 
-    # Prepare queries
-    add_senator = (
-        """
-        INSERT INTO senators (sen_id, f_name, l_name, party, gender, state)
-        VALUES (%s, %s, %s, %s, %s, %s);
-        """
-    )
-
-    add_bill = (
-        """
-        INSERT INTO bills (csr_id, congress, session, roll_call, bill_id, date)
-        VALUES (%s, %s, %s, %s, %s, %s);
-        """
-    )
-
-    add_vote = (
-        """
-        INSERT INTO votes (sen_id, csr_id, position)
-        VALUES (%s, %s, %s);
-        """
-    )
-
-    # Insert bills and votes into database
+    # Insert bills, senators and votes into database in one transaction
     if update == True:
-        # Must add bills first as it is a FK for votes
-        cursor.executemany(add_bill, bill_to_db)
-        cursor.executemany(add_vote, new_votes)
-        if update_sen == True:
-            cursor.executemany(add_senator, new_sens)
+        written = write_batch(conn, bills=bill_to_db, senators=new_sens, votes=new_votes)
+        print(written)
+
+        # Same rows to the local vote store, once it has been seeded (python vote_store.py --import)
+        store = VoteStore()
+        if store.exists():
+            print(store.append(bills=bill_to_db, senators=new_sens, votes=new_votes))
+        else:
+            print(f'No vote store at {store.root}, not appended')
 
     cursor.close()
     conn.close()
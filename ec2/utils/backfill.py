@@ -0,0 +1,97 @@
+import pickle
+import sys
+
+from fetch import Fetcher, QuotaExceeded
+from http_cache import DiskCache
+from propublica import (
+    api_key, propublica_fetcher, vote_menu_url, last_roll_call, roll_call_url, clean_vote,
+    senate_members_url, senator_row, is_bill_vote, vote_rows
+)
+from db import connect, write_batch
+
+# Function to get number of roll call votes for each session of congresses
+def session_roll_calls(congresses, fetcher):
+    sessions = [ (congress, session) for congress in congresses for session in (1, 2) ]
+    pages = fetcher.get_many([ vote_menu_url(c, s) for c, s in sessions ], method='get_text')
+    return { session: last_roll_call(page) for session, page in zip(sessions, pages) }
+
+# Function to fetch and clean every roll call vote of congresses
+def backfill_votes(congresses, key, cache=None):
+    menu_fetcher = Fetcher(rate=2, cache=cache)
+    roll_calls = session_roll_calls(congresses, menu_fetcher)
+    menu_fetcher.close()
+
+    urls = []
+    for (congress, session), last in roll_calls.items():
+        urls.extend([ roll_call_url(congress, session, n) for n in range(1, last + 1) ])
+    print(f'Fetching {len(urls)} roll call votes')
+
+    fetcher = propublica_fetcher(key, cache=cache)
+    responses = fetcher.get_many(urls, skip_errors=True)
+    fetcher.close()
+
+    # Same output as clean_votes in scrape_notebook.ipynb
+    return [ vote for vote in map(clean_vote, responses) if vote is not None ]
+
+# Function to fetch senators of congresses (first listing of each senator is kept)
+def backfill_senators(congresses, key, cache=None):
+    fetcher = propublica_fetcher(key, cache=cache)
+    responses = fetcher.get_many([ senate_members_url(c) for c in congresses ])
+    fetcher.close()
+    senators = {}
+    for r in responses:
+        for member in r['results'][0]['members']:
+            senators.setdefault(member['id'], senator_row(member))
+    return list(senators.values())
+
+# Function to split an iterable into lists of batch_size
+def batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Function to load cleaned votes (a list or a stream) into the database, one transaction per batch
+def load_votes(conn, votes, senators=(), batch_size=500):
+    written = write_batch(conn, senators=senators)
+    loaded = 0
+    for batch in batches(( vote for vote in votes if is_bill_vote(vote) ), batch_size):
+        bills = []
+        positions = []
+        for vote in batch:
+            bill, rows = vote_rows(vote)
+            bills.append(bill)
+            positions.extend(rows)
+        counts = write_batch(conn, bills=bills, votes=positions)
+        for table, n in counts.items():
+            written[table] += n
+        loaded += len(batch)
+        print(f'{loaded} votes, {written}')
+    return written
+
+if __name__ == '__main__':
+    # python backfill.py FIRST_CONGRESS LAST_CONGRESS [OUTPUT_PICKLE | --db]
+    first, last = int(sys.argv[1]), int(sys.argv[2])
+    output = sys.argv[3] if len(sys.argv) > 3 else f'c{first}_{last}.p'
+
+    cache = DiskCache()
+    try:
+        votes = backfill_votes(range(first, last + 1), api_key(), cache)
+        senators = backfill_senators(range(first, last + 1), api_key(), cache) if output == '--db' else []
+    except QuotaExceeded as e:
+        # Fetched responses are cached, running again tomorrow picks up where this run stopped
+        print(f'{e}, cache {cache.stats()}, run again once the quota resets')
+        sys.exit(1)
+    print(f'Cache {cache.stats()}')
+    if output == '--db':
+        conn = connect()
+        load_votes(conn, votes, senators)
+        conn.close()
+    else:
+        with open(output, 'wb') as f:
+            pickle.dump(votes, f)
+        print(f'{len(votes)} votes written to {output}')
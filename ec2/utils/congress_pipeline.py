@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from similarity import refresh_counts, counts_similarity, topk_neighbors
+from embedding import refresh_embedding
+from votes import congress_ranges, session_ranges
+from vote_matrix import VoteMatrix
+
+# Results of one congress (session is None) or one session of a congress.
+# sim and the topk arrays follow the senators passed in, members/xy/labels/
+# clusters/voting_length follow members (senators with yes/no votes in the unit).
+CongressResult = namedtuple('CongressResult', [
+    'congress', 'session', 'sim', 'most', 'least', 'party_most', 'party_least',
+    'members', 'voting_length', 'xy', 'labels', 'clusters',
+])
+
+# Vote matrices opened by this (worker) process, keyed by directory
+_opened = {}
+
+def shared_votes(path):
+    if path not in _opened:
+        _opened[path] = VoteMatrix.load(path)
+    return _opened[path]
+
+# Function to name each KMeans cluster after its member with the most votes
+def cluster_names(members, voting_length, labels):
+    names = {}
+    for label in np.unique(labels):
+        in_cluster = np.flatnonzero(labels == label)
+        senior = in_cluster[np.argmax(voting_length[in_cluster])]
+        names[int(label)] = f'{members[senior]} Cluster'
+    return [ names[int(label)] for label in labels ]
+
+# Function to run the analysis of one congress (or session), called in the workers
+def analyze_unit(path, unit, columns, senators, groups, state_dir, topk=10, clusters=5):
+    """
+    The vote matrix is opened from the memory mapped files at path, only the
+    unit's column range is materialized
+    """
+    congress, session = unit
+    start, stop = columns
+    block = shared_votes(path).column_range(start, stop)
+
+    name = f'counts_{congress}' if session is None else f'counts_{congress}_{session}'
+    counts = refresh_counts(os.path.join(state_dir, f'{name}.npz'), block)
+    sim = counts_similarity(counts, senators)
+    most, least = topk_neighbors(sim, senators, topk)
+    party_most, party_least = topk_neighbors(sim, senators, topk, groups)
+
+    # 2 component projection and clusters of the unit's voting senators (absent as 0),
+    # refit only when the unit's votes changed since the last run
+    block = block.select(senators=block.active_senators())
+    voting_length = block.voting_length()
+    if len(block.senators) >= 2:
+        embedding = refresh_embedding(
+            os.path.join(state_dir, f'{name.replace("counts", "embedding")}.npz'),
+            block, min(clusters, len(block.senators))
+        )
+        xy, labels = embedding.xy, embedding.labels
+    else:
+        xy = np.zeros((len(block.senators), 2))
+        labels = np.zeros(len(block.senators), dtype=np.int32)
+
+    return CongressResult(
+        congress, session, sim.astype(np.float32), most, least, party_most, party_least,
+        list(block.senators), voting_length, xy.astype(np.float32), labels,
+        cluster_names(block.senators, voting_length, labels),
+    )
+
+# Function to save a result as a per-congress artifact
+def save_result(result, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    name = f'congress_{result.congress}' if result.session is None else f'congress_{result.congress}_{result.session}'
+    tmp_path = os.path.join(out_dir, f'{name}.tmp.npz')
+    np.savez(
+        tmp_path,
+        sim=result.sim,
+        most=result.most,
+        least=result.least,
+        party_most=result.party_most,
+        party_least=result.party_least,
+        members=np.array(result.members, dtype=str),
+        voting_length=result.voting_length,
+        xy=result.xy,
+        labels=result.labels,
+        clusters=np.array(result.clusters, dtype=str),
+    )
+    os.replace(tmp_path, os.path.join(out_dir, f'{name}.npz'))
+
+# Function to analyze every congress (and optionally every session) in parallel
+def run_congresses(votes, senators, groups, state_dir, out_dir=None, sessions=False,
+                   max_workers=None, topk=10):
+    """
+    The vote matrix is written once as .npy files and memory mapped by each
+    worker, so it is not pickled per task and the pages are shared. Returns
+    {(congress, session): CongressResult}, session is None for whole congresses.
+    """
+    units = { (congress, None): r for congress, r in congress_ranges(votes.csr_ids).items() }
+    if sessions:
+        units.update(session_ranges(votes.csr_ids))
+
+    os.makedirs(state_dir, exist_ok=True)
+    path = tempfile.mkdtemp(prefix='vote_matrix-', dir=state_dir)
+    try:
+        votes.save(path)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                unit: pool.submit(analyze_unit, path, unit, columns, senators, groups, state_dir, topk)
+                for unit, columns in units.items()
+            }
+            results = { unit: future.result() for unit, future in futures.items() }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    if out_dir is not None:
+        for result in results.values():
+            save_result(result, out_dir)
+    return results
@@ -0,0 +1,185 @@
+import configparser
+import sys
+
+import psycopg2
+
+# Columns of each table, in the order rows are given
+COLUMNS = {
+    'bills': ('csr_id', 'congress', 'session', 'roll_call', 'bill_id', 'date'),
+    'senators': ('sen_id', 'f_name', 'l_name', 'party', 'gender', 'state'),
+    'votes': ('sen_id', 'csr_id', 'position'),
+}
+
+# votes only has a serial key, ON CONFLICT needs a unique key on (sen_id, csr_id).
+# Created once by migrate(), never by the writers.
+VOTES_KEY = """
+    CREATE UNIQUE INDEX IF NOT EXISTS votes_sen_csr ON votes (sen_id, csr_id)
+    ;
+    """
+
+# Queries finding the votes unique key, by driver
+VOTES_KEY_QUERIES = {
+    'psycopg2': "SELECT 1 FROM pg_indexes WHERE tablename = 'votes' AND indexname = 'votes_sen_csr';",
+    'sqlite3': "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'votes_sen_csr';",
+    'duckdb': "SELECT 1 FROM duckdb_indexes() WHERE index_name = 'votes_sen_csr';",
+}
+
+# Duplicate (sen_id, csr_id) rows left by the old executemany writer, the first
+# inserted row is kept ({key} is votes.id in Postgres, rowid in the stand-ins)
+VOTES_DEDUPE = """
+    DELETE FROM votes
+    WHERE {key} NOT IN (
+        SELECT MIN({key}) FROM votes GROUP BY sen_id, csr_id
+    )
+    ;
+    """
+
+# Tables as created in data_eng_notebook.ipynb, for local stand-ins (sqlite3,
+# duckdb) of the database. votes.id is SERIAL in Postgres, stand-ins leave it out.
+STAND_IN_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS senators (
+    sen_id TEXT PRIMARY KEY NOT NULL,
+    f_name TEXT NOT NULL,
+    l_name TEXT NOT NULL,
+    party TEXT NOT NULL,
+    gender TEXT NOT NULL,
+    state TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bills (
+    csr_id TEXT PRIMARY KEY NOT NULL,
+    congress INT NOT NULL,
+    session INT NOT NULL,
+    roll_call INT NOT NULL,
+    bill_id TEXT NOT NULL,
+    date DATE NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS votes (
+    sen_id TEXT references senators(sen_id),
+    csr_id TEXT references bills(csr_id),
+    position TEXT NOT NULL
+    );
+    """,
+)
+
+# SQLite allows 999 parameters per statement in older builds
+SQLITE_MAX_PARAMS = 999
+
+# Function to connect to the database
+def connect(path='../config.ini'):
+    config = configparser.ConfigParser()
+    config.read(path)
+    return psycopg2.connect(
+        host=config.get('aws', 'ENDPOINT'),
+        user=config.get('aws', 'USER'),
+        password=config.get('aws', 'PASSWORD'),
+        port=config.get('aws', 'PORT'),
+        database=config.get('aws', 'DATABASE')
+    )
+
+# Function to check connection is a sqlite3 stand-in
+def is_sqlite(conn):
+    return type(conn).__module__.startswith('sqlite3')
+
+# Drivers of local stand-ins using ? for parameters (psycopg2 uses %s)
+QMARK_DRIVERS = ('sqlite3', 'duckdb', '_duckdb')
+
+# Parameter placeholder of the connection's driver
+def placeholder(conn):
+    return '?' if type(conn).__module__.split('.')[0] in QMARK_DRIVERS else '%s'
+
+# Function to create the tables in a local stand-in database
+def create_stand_in(conn):
+    cursor = conn.cursor()
+    for statement in STAND_IN_SCHEMA + (VOTES_KEY,):
+        cursor.execute(statement)
+    cursor.close()
+    conn.commit()
+
+# Function to check the votes unique key is in place
+def has_votes_key(cursor, conn):
+    driver = type(conn).__module__.split('.')[0].lstrip('_')
+    cursor.execute(VOTES_KEY_QUERIES[driver])
+    return cursor.fetchone() is not None
+
+# Function to add the votes unique key, removing duplicate votes first (run once)
+def migrate(conn):
+    """
+    Both steps run in one transaction, so the key is only added once the table
+    is clean. Returns the number of duplicate votes removed.
+    """
+    key = 'id' if placeholder(conn) == '%s' else 'rowid'
+    cursor = conn.cursor()
+    try:
+        cursor.execute(VOTES_DEDUPE.format(key=key))
+        removed = max(cursor.rowcount, 0)
+        cursor.execute(VOTES_KEY)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return removed
+
+# Function to insert rows with multi-row VALUES, skipping rows already present
+def insert_rows(conn, cursor, table, rows, page_size=1000):
+    columns = COLUMNS[table]
+    if is_sqlite(conn):
+        page_size = min(page_size, SQLITE_MAX_PARAMS // len(columns))
+    row_marks = '(' + ', '.join([placeholder(conn)] * len(columns)) + ')'
+
+    written = 0
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        query = (
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES '
+            + ', '.join([row_marks] * len(page))
+            + ' ON CONFLICT DO NOTHING;'
+        )
+        cursor.execute(query, [ value for row in page for value in row ])
+        written += max(cursor.rowcount, 0)
+    return written
+
+# Function to write bills, senators and votes in one transaction
+def write_batch(conn, bills=(), senators=(), votes=(), page_size=1000):
+    """
+    Rows are tuples in COLUMNS order (as built in api_to_db.py and
+    data_eng_notebook.ipynb). Tables are written in foreign key order and rows
+    already in the database are skipped, so a rerun is safe and a failure
+    leaves nothing behind. Votes are skipped by their unique key, so writing
+    votes fails (RuntimeError) until migrate() added it. Returns the number of
+    rows written per table.
+    """
+    autocommit = getattr(conn, 'autocommit', False) is True
+    if autocommit:
+        conn.autocommit = False
+
+    votes = list(votes)
+    cursor = conn.cursor()
+    try:
+        if votes and not has_votes_key(cursor, conn):
+            raise RuntimeError('votes has no unique key on (sen_id, csr_id), run python db.py --migrate first')
+        written = {}
+        for table, rows in (('bills', bills), ('senators', senators), ('votes', votes)):
+            written[table] = insert_rows(conn, cursor, table, list(rows), page_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        if autocommit:
+            conn.autocommit = True
+    return written
+
+if __name__ == '__main__':
+    # python db.py --migrate, adds the votes unique key write_batch relies on
+    if '--migrate' in sys.argv[1:]:
+        conn = connect()
+        print(f'{migrate(conn)} duplicate votes removed, votes_sen_csr in place')
+        conn.close()
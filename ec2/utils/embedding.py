@@ -0,0 +1,198 @@
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from vote_matrix import VoteMatrix
+
+# 2D coordinates and cluster of each senator, with the fitted centers/components
+# (over csr_ids) kept to warm start the next run
+Embedding = namedtuple(
+    'Embedding',
+    ['senators', 'csr_ids', 'xy', 'labels', 'centers', 'components', 'fingerprint']
+)
+
+# PCA modes: 'full' (exact, dense), 'randomized' (dense) and 'incremental' (sparse,
+# batches of rows densified one at a time, for full history matrices)
+PCA_MODES = ('full', 'randomized', 'incremental')
+# KMeans modes: 'full' and 'minibatch'
+KMEANS_MODES = ('full', 'minibatch')
+
+def empty_embedding():
+    return Embedding([], [], np.zeros((0, 2)), np.zeros(0, dtype=np.int32), np.zeros((0, 0)), np.zeros((2, 0)), '')
+
+# Function to hash the votes and fit settings, an unchanged fingerprint means an unchanged fit
+def vote_fingerprint(votes, **settings):
+    scores = votes.scores.copy()
+    scores.sum_duplicates()
+    scores.eliminate_zeros()
+    digest = hashlib.sha1()
+    for part in (votes.senators, votes.csr_ids, sorted(settings.items())):
+        digest.update(repr(part).encode())
+    for array in (scores.indptr, scores.indices, scores.data):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+def save_embedding(path, embedding):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp.npz'
+    np.savez(
+        tmp_path,
+        senators=np.array(embedding.senators, dtype=str),
+        csr_ids=np.array(embedding.csr_ids, dtype=str),
+        xy=embedding.xy,
+        labels=embedding.labels,
+        centers=embedding.centers,
+        components=embedding.components,
+        fingerprint=np.array(embedding.fingerprint),
+    )
+    os.replace(tmp_path, path)
+
+def load_embedding(path):
+    if not os.path.exists(path):
+        return empty_embedding()
+    with np.load(path) as f:
+        return Embedding(
+            list(f['senators']),
+            list(f['csr_ids']),
+            f['xy'],
+            f['labels'],
+            f['centers'],
+            f['components'],
+            str(f['fingerprint']),
+        )
+
+# Function to give the columns of votes also in previous (positions in votes, positions in previous)
+def shared_columns(votes, previous):
+    position = { csr_id: j for j, csr_id in enumerate(previous.csr_ids) }
+    pairs = [ (j, position[csr_id]) for j, csr_id in enumerate(votes.csr_ids) if csr_id in position ]
+    if not pairs:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    new, old = zip(*pairs)
+    return np.array(new), np.array(old)
+
+# Function to build initial cluster centers from the previous fit
+def warm_centers(votes, X, previous, clusters):
+    """
+    Previous centers on the roll calls still in votes, roll calls added since
+    get the mean of the previous members of each cluster. None (cold start)
+    when the number of clusters changed or no roll call is shared.
+    """
+    if len(previous.centers) != clusters:
+        return None
+    new, old = shared_columns(votes, previous)
+    if len(new) == 0:
+        return None
+    init = np.zeros((clusters, X.shape[1]))
+    init[:, new] = previous.centers[:, old]
+    fresh = np.setdiff1d(np.arange(X.shape[1]), new)
+    if len(fresh):
+        previous_labels = dict(zip(previous.senators, previous.labels))
+        rows = np.array([ previous_labels.get(sen, -1) for sen in votes.senators ])
+        for k in range(clusters):
+            members = X[rows == k][:, fresh]
+            if members.shape[0]:
+                init[k, fresh] = np.asarray(members.mean(axis=0)).ravel()
+    return init
+
+# Function to refine previous components into the top 2 of X by subspace iteration
+def warm_pca(X, init, tol=1e-10, max_iter=100):
+    """
+    init holds the previous components as columns (roll calls added since
+    are 0). X is centered implicitly, so a sparse X stays sparse. Returns
+    (xy, components) like PCA.fit_transform and PCA.components_.
+    """
+    mean = np.asarray(X.mean(axis=0)).ravel()
+
+    def project(V):
+        return X @ V - mean @ V
+
+    V, _ = np.linalg.qr(init)
+    for _ in range(max_iter):
+        U = project(V)
+        W, _ = np.linalg.qr(X.T @ U - np.outer(mean, U.sum(axis=0)))
+        # Rotate to the principal axes of the projected data (largest first)
+        _, _, Rt = np.linalg.svd(project(W), full_matrices=False)
+        W = W @ Rt.T
+        converged = np.all(1 - np.abs((V * W).sum(axis=0)) < tol)
+        V = W
+        if converged:
+            break
+    return project(V), V.T
+
+# Function to embed the senators of a vote matrix in 2D and cluster them
+def fit_embedding(votes, previous=None, clusters=5, pca='full', kmeans='full', batch_size=1024, random_state=0):
+    """
+    Senators are rows of yes (1) / no (-1) scores, everything else 0 (the
+    dense df_current of to_csv). With a previous embedding KMeans starts from
+    its centers (see warm_centers), so labels keep their numbers when the votes
+    barely change. In the randomized and incremental modes its components are
+    refined (see warm_pca) instead of fitting from scratch, 'full' always
+    refits exactly. Component signs are flipped to agree with the previous
+    components, so the plot is not mirrored from one run to the next.
+    """
+    if pca not in PCA_MODES or kmeans not in KMEANS_MODES:
+        raise ValueError(f'Unknown embedding mode {pca}/{kmeans}')
+    previous = empty_embedding() if previous is None else previous
+    X = votes.scores.astype(np.float64)
+
+    new, old = shared_columns(votes, previous)
+    init = np.zeros((X.shape[1], 2))
+    if len(new) and len(previous.components):
+        init[new] = previous.components[:, old].T
+    if pca != 'full' and np.linalg.matrix_rank(init) == 2:
+        xy, components = warm_pca(X, init)
+    elif pca == 'incremental':
+        reducer = IncrementalPCA(2, batch_size=max(batch_size, 2))
+        xy = reducer.fit_transform(X)
+        components = reducer.components_
+    else:
+        reducer = PCA(2, svd_solver=pca, random_state=random_state)
+        xy = reducer.fit_transform(X.toarray())
+        components = reducer.components_
+
+    if len(new) and len(previous.components):
+        signs = np.where((components[:, new] * previous.components[:, old]).sum(axis=1) < 0, -1, 1)
+        components = components * signs[:, None]
+        xy = xy * signs
+
+    init = warm_centers(votes, X, previous, clusters)
+    if kmeans == 'minibatch':
+        cl_algo = MiniBatchKMeans(
+            clusters, init='k-means++' if init is None else init, n_init=3 if init is None else 1,
+            batch_size=batch_size, random_state=random_state
+        )
+    else:
+        cl_algo = KMeans(
+            clusters, init='k-means++' if init is None else init, n_init=10 if init is None else 1,
+            random_state=random_state
+        )
+    labels = cl_algo.fit_predict(X)
+
+    return Embedding(
+        list(votes.senators),
+        list(votes.csr_ids),
+        xy,
+        labels.astype(np.int32),
+        cl_algo.cluster_centers_,
+        components,
+        vote_fingerprint(votes, clusters=clusters, pca=pca, kmeans=kmeans),
+    )
+
+# Function to bring the saved embedding at path up to date with the vote matrix
+def refresh_embedding(path, votes, clusters=5, pca='full', kmeans='full', batch_size=1024, random_state=0):
+    """
+    The saved embedding is returned as is when the fingerprint of votes and
+    settings did not change, otherwise it is refit warm started from it
+    """
+    if not isinstance(votes, VoteMatrix):
+        votes = VoteMatrix.from_frame(votes)
+    previous = load_embedding(path)
+    if previous.fingerprint == vote_fingerprint(votes, clusters=clusters, pca=pca, kmeans=kmeans):
+        return previous
+    embedding = fit_embedding(votes, previous, clusters, pca, kmeans, batch_size, random_state)
+    save_embedding(path, embedding)
+    return embedding
@@ -0,0 +1,171 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Function to rebuild a response from a cached body
+def cached_response(url, body, encoding):
+    r = requests.Response()
+    r.url = url
+    r.status_code = 200
+    r._content = body
+    r.encoding = encoding
+    return r
+
+# Token bucket shared by all threads of a Fetcher
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Raised when the daily request budget is used up (not a RequestException, so
+# get_many(skip_errors=True) stops instead of skipping the remaining urls)
+class QuotaExceeded(Exception):
+    pass
+
+# Requests allowed per UTC day, counted in a json file so that separate runs share the budget
+class DailyQuota:
+    def __init__(self, limit, path=None):
+        self.limit = limit
+        self.path = path
+        self.lock = threading.Lock()
+        self.day, self.used = self.load()
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return None, 0
+        with open(self.path) as f:
+            state = json.load(f)
+        return state['day'], state['used']
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'day': self.day, 'used': self.used}, f)
+        os.replace(tmp_path, self.path)
+
+    def take(self):
+        """
+        Count one request, QuotaExceeded once limit requests were made today
+        """
+        with self.lock:
+            today = datetime.now(timezone.utc).date().isoformat()
+            if self.day != today:
+                self.day, self.used = today, 0
+            if self.used >= self.limit:
+                raise QuotaExceeded(f'Daily quota of {self.limit} requests used up')
+            self.used += 1
+            self.save()
+
+# Pooled, rate-limited HTTP client with retries
+class Fetcher:
+    """
+    Requests go through one pooled session, at most max_workers at a time and
+    at most rate per second, 429/5xx responses and connection errors are retried
+    with exponential backoff (or the server's Retry-After). With a cache
+    (http_cache.DiskCache) successful responses are stored and reused. With a
+    quota (DailyQuota) every request sent, retries included, is counted and
+    QuotaExceeded is raised once it is used up, cached responses are free.
+    """
+    def __init__(self, headers=None, rate=5, burst=None, max_workers=8, retries=5,
+                 backoff=1.0, timeout=30, cache=None, quota=None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers is not None:
+            self.session.headers.update(headers)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.quota = quota
+
+    def delay(self, attempt, response=None):
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return int(response.headers['Retry-After'])
+        return self.backoff * 2 ** attempt * (1 + random.random() / 2)
+
+    def get(self, url):
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached_response(url, *cached)
+
+        for attempt in range(self.retries + 1):
+            if self.quota is not None:
+                self.quota.take()
+            self.bucket.acquire()
+            try:
+                r = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.delay(attempt))
+                continue
+            if r.status_code in RETRY_STATUS and attempt < self.retries:
+                time.sleep(self.delay(attempt, r))
+                continue
+            r.raise_for_status()
+            if self.cache is not None:
+                self.cache.put(url, r.content, r.encoding)
+            return r
+
+    def get_json(self, url):
+        return self.get(url).json()
+
+    def get_text(self, url):
+        return self.get(url).text
+
+    def get_many(self, urls, method='get_json', skip_errors=False):
+        """
+        Fetch urls concurrently, results are returned in the order of urls, with
+        skip_errors failed requests give None instead of raising
+        """
+        fetch = getattr(self, method)
+
+        def fetch_one(url):
+            try:
+                return fetch(url)
+            except (requests.RequestException, ValueError):
+                if skip_errors:
+                    return None
+                raise
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            return list(pool.map(fetch_one, urls))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+# Seconds a response of the recent votes endpoint stays fresh
+RECENT_TTL = 15 * 60
+
+# Seconds a vote menu or member list of the congress/session in progress stays fresh
+OPEN_TTL = 24 * 60 * 60
+
+VOTE_MENU_URL = re.compile(r'vote_menu_(\d+)_(\d+)\.htm$')
+MEMBERS_URL = re.compile(r'/(\d+)/senate/members\.json$')
+
+# Function to give the congress and session in progress on a day (sessions follow calendar years)
+def current_session(day=None):
+    day = day or date.today()
+    return (day.year - 1789) // 2 + 1, 2 - day.year % 2
+
+# Function to give time to live for a url, None means stored permanently
+def default_ttl(url, day=None):
+    """
+    Roll calls, and the vote menus and member lists of closed sessions, do not
+    change. The list of recent votes does, and so do the vote menu (roll call
+    count) and member list of the session in progress.
+    """
+    if url.endswith('/recent.json'):
+        return RECENT_TTL
+    # A session can run into the first days of January, keep the previous one open for a week
+    congress, session = current_session((day or date.today()) - timedelta(days=7))
+    menu = VOTE_MENU_URL.search(url)
+    if menu and (int(menu.group(1)), int(menu.group(2))) >= (congress, session):
+        return OPEN_TTL
+    members = MEMBERS_URL.search(url)
+    if members and int(members.group(1)) >= congress:
+        return OPEN_TTL
+    return None
+
+# Disk cache of response bodies keyed by url
+class DiskCache:
+    """
+    Each entry is one file named by the sha256 of its url, holding a json header
+    line (url, time stored, encoding) and the body. When the cache grows past
+    max_bytes the least recently used entries are removed.
+    """
+    def __init__(self, path='./cache', max_bytes=2 * 1024 ** 3, ttl=default_ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+    def file(self, url):
+        return os.path.join(self.path, hashlib.sha256(url.encode()).hexdigest())
+
+    def get(self, url):
+        """
+        Returns (body, encoding) or None when missing or expired
+        """
+        path = self.file(url)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            header = None
+        ttl = self.ttl(url)
+        if header is None or header['url'] != url or (ttl is not None and time.time() - header['stored'] > ttl):
+            with self.lock:
+                self.misses += 1
+            return None
+        # Modified time marks last use for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self.lock:
+            self.hits += 1
+        return body, header['encoding']
+
+    def put(self, url, body, encoding=None):
+        path = self.file(url)
+        header = json.dumps({'url': url, 'stored': time.time(), 'encoding': encoding}).encode()
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header + b'\n' + body)
+        with self.lock:
+            if os.path.exists(path):
+                self.size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self.size += os.path.getsize(path)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries down to 90% of max_bytes. Other
+        threads or processes may share the directory, so the size is re-synced
+        from the scan and entries that vanish meanwhile are skipped.
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self.size = sum(size for _, size, _ in entries)
+        # Evict down to 90% so a full cache is not rescanned on every put
+        for _, size, path in entries:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            self.size -= size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.size}
@@ -0,0 +1,59 @@
+import logging
+import sys
+
+from senate_xml import read_votes, read_id_map, MemberIds
+from propublica import is_bill_vote
+from backfill import load_votes
+from db import connect
+from votes import encode_votes
+from vote_matrix import VoteMatrix
+
+log = logging.getLogger(__name__)
+
+SENATORS_QUERY = """
+    SELECT sen_id, f_name, l_name, state FROM senators
+    ;
+    """
+
+# Function to load a directory or tarball of senate.gov roll call files into the database
+def ingest_db(conn, path, id_map=None, batch_size=500):
+    """
+    Votes are streamed from the files into write_batch batches, members are
+    mapped to senators table ids (see senate_xml.MemberIds) and members that
+    can not be mapped are logged and left out
+    """
+    cursor = conn.cursor()
+    cursor.execute(SENATORS_QUERY)
+    ids = MemberIds(cursor.fetchall(), id_map)
+    cursor.close()
+
+    written = load_votes(conn, ( ids.apply(vote) for vote in read_votes(path) ), batch_size=batch_size)
+    for lis_id, name in sorted(ids.unresolved.items()):
+        log.warning('Unresolved member %s: %s', lis_id, name)
+    return written
+
+# Function to build a vote matrix (senators keyed by name) straight from the files
+def ingest_matrix(path):
+    rows = [
+        (f'{position["first_name"]} {position["last_name"]}',
+         f'{vote["congress"]}.{vote["session"]}.{vote["roll_call"]}',
+         position['vote_position'])
+        for vote in read_votes(path) if is_bill_vote(vote) for position in vote['positions']
+    ]
+    return VoteMatrix.from_coded(encode_votes(rows))
+
+if __name__ == '__main__':
+    # python ingest_xml.py PATH [--ids IDS_CSV] [--matrix OUTPUT_DIR]
+    # PATH is a directory or tarball of vote_<congress>_<session>_<number>.xml files
+    args = sys.argv[1:]
+    path = args[0]
+    id_map = read_id_map(args[args.index('--ids') + 1]) if '--ids' in args else None
+    if '--matrix' in args:
+        output = args[args.index('--matrix') + 1]
+        votes = ingest_matrix(path)
+        votes.save(output)
+        print(f'{votes.shape[0]} senators x {votes.shape[1]} roll calls written to {output}')
+    else:
+        conn = connect()
+        print(ingest_db(conn, path, id_map))
+        conn.close()
@@ -0,0 +1,109 @@
+import configparser
+import re
+
+from bs4 import BeautifulSoup
+
+from fetch import Fetcher, DailyQuota
+
+API_ROOT = 'https://api.propublica.org/congress/v1'
+VOTE_MENU = 'https://www.senate.gov/legislative/LIS/roll_call_lists/vote_menu_{congress}_{session}.htm'
+
+# Requests per second to the ProPublica API
+API_RATE = 5
+
+# Requests per day the key allows, counted across runs in QUOTA_PATH
+API_QUOTA = 5000
+QUOTA_PATH = './state/propublica_quota.json'
+
+# Function to read ProPublica API key
+def api_key(path='../config.ini'):
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config.get('propublica', 'PROPUBLICA_API_KEY')
+
+# Function to create fetcher for ProPublica API
+def propublica_fetcher(key, **kwargs):
+    kwargs.setdefault('rate', API_RATE)
+    if 'quota' not in kwargs:
+        kwargs['quota'] = DailyQuota(API_QUOTA, QUOTA_PATH)
+    return Fetcher(headers={'X-API-Key': key}, **kwargs)
+
+def recent_votes_url():
+    return f'{API_ROOT}/senate/votes/recent.json'
+
+def roll_call_url(congress, session, roll_call):
+    return f'{API_ROOT}/{congress}/senate/sessions/{session}/votes/{roll_call}.json'
+
+def member_url(member_id):
+    return f'{API_ROOT}/members/{member_id}.json'
+
+def vote_menu_url(congress, session):
+    return VOTE_MENU.format(congress=congress, session=session)
+
+# Function to get number of roll call votes in a session from senate.gov vote menu
+def last_roll_call(html):
+    soup = BeautifulSoup(html, 'lxml')
+    last = soup.find('td').find('a').text
+    return int(re.search(r'^...(?=\\)*', last).group(0))
+
+# Function to extract relevant information from roll call json (as in clean_votes)
+def clean_vote(response):
+    try:
+        results = response['results']['votes']['vote']
+        return {
+            'congress': results['congress'],
+            'session': results['session'],
+            'roll_call': results['roll_call'],
+            'bill_id': results['bill']['bill_id'],
+            'date': results['date'],
+            'positions': results['positions']
+        }
+    except (KeyError, TypeError):
+        return None
+
+def senate_members_url(congress):
+    return f'{API_ROOT}/{congress}/senate/members.json'
+
+# Function to check vote is on a bill, integer bill_ids are codes for treaty votes, etc.
+def is_bill_vote(vote):
+    try:
+        int(vote['bill_id'])
+    except (TypeError, ValueError):
+        return vote['bill_id'] is not None
+    return False
+
+# Function to create rows for bills and votes tables from a cleaned vote
+def vote_rows(vote):
+    csr_id = f'{vote["congress"]}.{vote["session"]}.{vote["roll_call"]}'
+    bill = (
+        csr_id,
+        vote['congress'],
+        vote['session'],
+        vote['roll_call'],
+        vote['bill_id'],
+        vote['date']
+    )
+    votes = [ (position['member_id'], csr_id, position['vote_position']) for position in vote['positions'] ]
+    return bill, votes
+
+# Function to create senators row from a member of the senate members list
+def senator_row(member):
+    return (
+        member['id'],
+        member['first_name'],
+        member['last_name'],
+        member['party'],
+        member['gender'] or 'N',
+        member['state'],
+    )
+
+# Function to create senators row from the members endpoint (party and state live elsewhere)
+def member_row(member):
+    return (
+        member['id'],
+        member['first_name'],
+        member['last_name'],
+        member['current_party'],
+        member['gender'] or 'N',
+        member['roles'][0]['state'],
+    )
@@ -0,0 +1,168 @@
+import csv
+import logging
+import os
+import re
+import tarfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# senate.gov positions as stored in the votes table (ProPublica wording)
+POSITIONS = {'Yea': 'Yes', 'Nay': 'No', 'Present': 'Present', 'Not Voting': 'Not Voting'}
+
+# senate.gov document types of bills and resolutions, as ProPublica bill_id prefixes
+DOCUMENT_TYPES = {
+    'S.': 's',
+    'H.R.': 'hr',
+    'S.J.Res.': 'sjres',
+    'H.J.Res.': 'hjres',
+    'S.Con.Res.': 'sconres',
+    'H.Con.Res.': 'hconres',
+    'S.Res.': 'sres',
+    'H.Res.': 'hres',
+}
+
+# File names of roll call votes (vote_116_1_00001.xml)
+VOTE_FILE = re.compile(r'vote_\d+_\d+_\d+\.xml$')
+
+# Function to give the ProPublica style bill_id of a roll call document, None for
+# nominations, treaties, etc. (filtered out later like integer bill_ids)
+def document_bill_id(doc_type, number, congress):
+    prefix = DOCUMENT_TYPES.get((doc_type or '').replace(' ', ''))
+    if prefix is None or not number:
+        return None
+    return f'{prefix}{number}-{congress}'
+
+# Function to turn 'January 3, 2019, 03:47 PM' into '2019-01-03'
+def vote_date(text):
+    return datetime.strptime(', '.join(text.split(', ')[:2]), '%B %d, %Y').date().isoformat()
+
+# Function to parse one roll call vote file into the cleaned vote of propublica.clean_vote
+def parse_vote(source):
+    """
+    source is a path or file object. Elements are parsed with iterparse and
+    each member is cleared once read, so no whole document tree is kept.
+    Positions hold lis_member_id (senate.gov ids) as member_id plus the name
+    and state needed to map them to the senators table. Returns None for files
+    without the fields of a roll call or with unknown positions.
+    """
+    fields = {}
+    document = {}
+    positions = []
+    member = {}
+    path = []
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem.tag)
+            continue
+        path.pop()
+        parent = path[-1] if path else None
+        if parent == 'member':
+            member[elem.tag] = (elem.text or '').strip()
+        elif elem.tag == 'member':
+            position = POSITIONS.get(member.get('vote_cast'))
+            if position is None:
+                return None
+            positions.append({
+                'member_id': member.get('lis_member_id'),
+                'vote_position': position,
+                'first_name': member.get('first_name'),
+                'last_name': member.get('last_name'),
+                'party': member.get('party'),
+                'state': member.get('state'),
+            })
+            member = {}
+            elem.clear()
+        elif parent == 'document':
+            document[elem.tag] = (elem.text or '').strip()
+        elif parent == 'roll_call_vote':
+            if elem.tag not in ('members', 'document'):
+                fields[elem.tag] = (elem.text or '').strip()
+            elem.clear()
+
+    try:
+        return {
+            'congress': int(fields['congress']),
+            'session': int(fields['session']),
+            'roll_call': int(fields['vote_number']),
+            'bill_id': document_bill_id(
+                document.get('document_type'),
+                document.get('document_number'),
+                document.get('document_congress') or fields['congress']
+            ),
+            'date': vote_date(fields['vote_date']),
+            'positions': positions,
+        }
+    except (KeyError, ValueError, IndexError):
+        return None
+
+# Function to stream cleaned votes from a directory or tarball of roll call vote files
+def read_votes(path):
+    """
+    Files are read one at a time (a tarball in stream mode, never extracted),
+    unparseable files are logged and skipped
+    """
+    if os.path.isdir(path):
+        names = sorted(
+            os.path.join(root, name) for root, _, files in os.walk(path) for name in files if VOTE_FILE.search(name)
+        )
+        for name in names:
+            vote = parse_vote(name)
+            if vote is None:
+                log.warning('Skipped %s, not a roll call vote', name)
+            else:
+                yield vote
+    else:
+        with tarfile.open(path, mode='r|*') as tar:
+            for info in tar:
+                if not info.isfile() or not VOTE_FILE.search(info.name):
+                    continue
+                vote = parse_vote(tar.extractfile(info))
+                if vote is None:
+                    log.warning('Skipped %s, not a roll call vote', info.name)
+                else:
+                    yield vote
+
+# Function to read a lis_member_id -> sen_id mapping (csv with those two columns)
+def read_id_map(path):
+    with open(path, newline='') as f:
+        return { row['lis_member_id']: row['sen_id'] for row in csv.DictReader(f) }
+
+# senate.gov member ids to senators table ids
+class MemberIds:
+    """
+    An explicit mapping wins, otherwise a senator of the senators table with
+    the same last name and state (and first name, when several match) is used
+    """
+    def __init__(self, senators, id_map=None):
+        self.id_map = dict(id_map or {})
+        self.by_name = {}
+        for sen_id, f_name, l_name, state in senators:
+            self.by_name.setdefault((l_name.casefold(), state), []).append((sen_id, f_name.casefold()))
+        self.unresolved = {}
+
+    def resolve(self, position):
+        lis_id = position['member_id']
+        if lis_id in self.id_map:
+            return self.id_map[lis_id]
+        candidates = self.by_name.get(((position['last_name'] or '').casefold(), position['state']), [])
+        if len(candidates) > 1:
+            first = (position['first_name'] or '').casefold()
+            candidates = [ c for c in candidates if c[1].startswith(first) or first.startswith(c[1]) ]
+        if len(candidates) == 1:
+            self.id_map[lis_id] = candidates[0][0]
+            return candidates[0][0]
+        self.unresolved[lis_id] = f'{position["first_name"]} {position["last_name"]} ({position["state"]})'
+        return None
+
+    def apply(self, vote):
+        """
+        The vote with member_id replaced by sen_id, positions of unresolved members dropped
+        """
+        positions = []
+        for position in vote['positions']:
+            sen_id = self.resolve(position)
+            if sen_id is not None:
+                positions.append({'member_id': sen_id, 'vote_position': position['vote_position']})
+        return dict(vote, positions=positions)
@@ -0,0 +1,217 @@
+import hashlib
+import logging
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from vote_matrix import VoteMatrix
+
+log = logging.getLogger(__name__)
+
+# Vote values accepted by the similarity engine (NaN marks a missing vote)
+VOTE_VALUES = (-1, 0, 1)
+
+# Function to split vote matrix into indicator matrices
+def vote_indicators(values):
+    """
+    Split a senator x bill matrix of votes (1, 0, -1 or NaN) into float
+    indicator matrices for yes, no and zero (not voting/present) positions
+    """
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    unknown = present & ~np.isin(values, VOTE_VALUES)
+    if unknown.any():
+        raise ValueError(f'Unexpected vote values: {np.unique(values[unknown])}')
+    yes = (values == 1).astype(float)
+    no = (values == -1).astype(float)
+    zero = (values == 0).astype(float)
+    return yes, no, zero
+
+# Function to count agreements and shared votes for all pairs of senators
+def agreement_counts(values):
+    """
+    Returns (agree, total) where total[i, j] is the number of bills both senators
+    have a vote for and agree[i, j] is the sum of vote_sim agreements over those bills
+    """
+    yes, no, zero = vote_indicators(values)
+    cast = yes + no
+    present = cast + zero
+
+    total = present @ present.T
+    agree = yes @ yes.T + no @ no.T
+    if zero.any():
+        # A zero against a yes/no counts as half an agreement in vote_sim
+        half = zero @ cast.T
+        agree += zero @ zero.T + (half + half.T) / 2
+    return agree, total
+
+# Function to turn agreement counts into a rounded similarity matrix
+def similarity_from_counts(agree, total, decimals=2):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sim_mat = np.where(total > 0, agree / total, np.nan)
+    # Python's round (as used by the pairwise loop) is correctly rounded while
+    # np.round is not, so round each distinct ratio with the builtin
+    ratios, inverse = np.unique(sim_mat, return_inverse=True)
+    rounded = np.array([ round(float(r), decimals) for r in ratios ])
+    sim_mat = rounded[inverse].reshape(sim_mat.shape)
+    np.fill_diagonal(sim_mat, np.nan)
+    return sim_mat
+
+# Create matrix for voting similarity between senators
+def fast_similarity_matrix(df):
+    """
+    Batched equivalent of the pairwise vote_sim loop, pairs without any shared
+    votes are NaN
+    """
+    agree, total = agreement_counts(df.to_numpy(dtype=float))
+    return similarity_from_counts(agree, total)
+
+# Agreement counts kept between runs, rows/columns of agree and total follow senators,
+# checksum is the vote_checksum of the counted roll calls (0 when not tracked)
+AgreementCounts = namedtuple(
+    'AgreementCounts', ['senators', 'csr_ids', 'agree', 'total', 'checksum'], defaults=(0,)
+)
+
+# Multipliers mixing senator, roll call and score hashes (64-bit odd constants)
+CHECKSUM_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+# Function to give a 64-bit hash of each string
+def string_hashes(values):
+    return np.array([
+        int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little') for value in values
+    ], dtype=np.uint64)
+
+# Function to checksum the yes/no votes of a vote matrix
+def vote_checksum(votes):
+    """
+    Sum (mod 2**64) of a hash of each (senator, csr_id, score), so it does not
+    depend on row/column order and the checksum of two sets of roll calls is
+    the sum of theirs
+    """
+    scores = votes.scores.tocoo()
+    keep = scores.data != 0
+    rows, cols = scores.row[keep], scores.col[keep]
+    scores = scores.data[keep].astype(np.int64).astype(np.uint64)
+    mixed = string_hashes(votes.senators)[rows] ^ (string_hashes(votes.csr_ids)[cols] * CHECKSUM_MIX[0])
+    mixed = (mixed ^ ((scores + np.uint64(2)) * CHECKSUM_MIX[1])) * CHECKSUM_MIX[2]
+    mixed ^= mixed >> np.uint64(29)
+    return int(mixed.sum(dtype=np.uint64))
+
+def empty_counts():
+    return AgreementCounts([], [], np.zeros((0, 0)), np.zeros((0, 0)))
+
+# Function to add the votes of roll calls not yet counted
+def update_counts(counts, votes):
+    """
+    votes is a VoteMatrix (or a score DataFrame, with 0 taken as not voting).
+    Only the bills missing from counts.csr_ids are read and only the senators
+    who voted on them are touched, new senators are appended. Votes on bills
+    already counted are not read again (see refresh_counts).
+    """
+    if not isinstance(votes, VoteMatrix):
+        votes = VoteMatrix.from_frame(votes)
+    known_bills = set(counts.csr_ids)
+    new_bills = [ bill for bill in votes.csr_ids if bill not in known_bills ]
+    known_sens = set(counts.senators)
+    new_sens = [ sen for sen in votes.senators if sen not in known_sens ]
+
+    senators = counts.senators + new_sens
+    n = len(senators)
+    agree = np.zeros((n, n))
+    total = np.zeros((n, n))
+    m = len(counts.senators)
+    agree[:m, :m] = counts.agree
+    total[:m, :m] = counts.total
+
+    checksum = counts.checksum
+    if new_bills:
+        block = votes.select(csr_ids=new_bills)
+        checksum = (checksum + vote_checksum(block)) % 2 ** 64
+        block = block.select(senators=block.active_senators())
+        position = { sen: i for i, sen in enumerate(senators) }
+        rows = np.array([ position[sen] for sen in block.senators ], dtype=int)
+        block_agree, block_total = block.agreement_counts()
+        agree[np.ix_(rows, rows)] += block_agree
+        total[np.ix_(rows, rows)] += block_total
+
+    return AgreementCounts(senators, counts.csr_ids + new_bills, agree, total, checksum)
+
+# Function to derive the similarity matrix for senators (in that order) from counts
+def counts_similarity(counts, senators):
+    position = { sen: i for i, sen in enumerate(counts.senators) }
+    rows = np.array([ position[sen] for sen in senators ], dtype=int)
+    return similarity_from_counts(counts.agree[np.ix_(rows, rows)], counts.total[np.ix_(rows, rows)])
+
+def save_counts(path, counts):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp.npz'
+    np.savez(
+        tmp_path,
+        senators=np.array(counts.senators, dtype=str),
+        csr_ids=np.array(counts.csr_ids, dtype=str),
+        agree=counts.agree,
+        total=counts.total,
+        checksum=np.uint64(counts.checksum),
+    )
+    os.replace(tmp_path, path)
+
+def load_counts(path):
+    if not os.path.exists(path):
+        return empty_counts()
+    with np.load(path) as f:
+        return AgreementCounts(
+            list(f['senators']),
+            list(f['csr_ids']),
+            f['agree'],
+            f['total'],
+            # Counts saved before checksums were kept never match, so they are rebuilt once
+            int(f['checksum']) if 'checksum' in f.files else None,
+        )
+
+# Function to bring the saved counts at path up to date with the vote matrix
+def refresh_counts(path, votes):
+    """
+    Counts are rebuilt from scratch when a counted roll call is no longer in
+    votes or the votes on the counted roll calls changed since they were
+    counted (a re-cast position, a senator added to them), as found by
+    comparing their vote_checksum with the saved one
+    """
+    if not isinstance(votes, VoteMatrix):
+        votes = VoteMatrix.from_frame(votes)
+    counts = load_counts(path)
+    if not set(counts.csr_ids) <= set(votes.csr_ids):
+        log.warning('%s counts roll calls no longer in the votes, rebuilding', path)
+        counts = empty_counts()
+    elif vote_checksum(votes.select(csr_ids=counts.csr_ids)) != counts.checksum:
+        log.warning('%s out of sync with votes, rebuilding', path)
+        counts = empty_counts()
+    counts = update_counts(counts, votes)
+    save_counts(path, counts)
+    return counts
+
+# Function to rank the k most and k least similar senators for every senator
+def topk_neighbors(sim_mat, senators, k=10, groups=None):
+    """
+    Returns (most, least), int32 arrays of shape (n, k) holding positions in
+    senators, padded with -1 when a senator has fewer than k neighbors. Ties are
+    broken by name and pairs without a similarity are left out. With groups (one
+    label per senator, e.g. party) only senators of the same group are ranked.
+    """
+    sim_mat = np.array(sim_mat, dtype=float)
+    n = len(senators)
+    np.fill_diagonal(sim_mat, np.nan)
+    if groups is not None:
+        groups = np.asarray(groups, dtype=object)
+        sim_mat[groups[:, None] != groups[None, :]] = np.nan
+
+    valid = ~np.isnan(sim_mat)
+    name_rank = np.broadcast_to(np.argsort(np.argsort(np.array(senators, dtype=str))), (n, n))
+    k = min(k, n)
+    ranked = []
+    for sign in (-1, 1):
+        key = np.where(valid, sign * sim_mat, np.inf)
+        order = np.lexsort((name_rank, key), axis=-1)[:, :k]
+        order = np.where(np.take_along_axis(valid, order, axis=-1), order, -1)
+        ranked.append(order.astype(np.int32))
+    return ranked[0], ranked[1]
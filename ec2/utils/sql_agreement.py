@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from db import placeholder
+from similarity import AgreementCounts
+from votes import NAMES_QUERY
+
+# Agreement (same position) and co-vote counts of each pair of senators over the
+# bills both cast a yes/no vote on, each unordered pair once (a.sen_id <= b.sen_id)
+AGREEMENT_QUERY = """
+    SELECT a.sen_id, b.sen_id,
+        SUM(CASE WHEN a.position = b.position THEN 1 ELSE 0 END),
+        COUNT(*)
+    FROM votes a
+    JOIN votes b ON a.csr_id = b.csr_id AND a.sen_id <= b.sen_id
+    JOIN bills ON a.csr_id = bills.csr_id
+    WHERE a.position IN ('Yes', 'No') AND b.position IN ('Yes', 'No'){congress}
+    GROUP BY a.sen_id, b.sen_id
+    ;
+    """
+
+# Function to count agreements inside the database, only pair rows are transferred
+def sql_agreement_counts(conn, congress=None):
+    """
+    Same counts as VoteMatrix.agreement_counts, for one congress or all of them.
+    Senators are keyed by name like the streamed votes (ids without a senators
+    row are dropped), senators without any yes/no vote are not in the result.
+    csr_ids is left empty, the counts can not be updated with update_counts.
+    """
+    cursor = conn.cursor()
+    if congress is None:
+        cursor.execute(AGREEMENT_QUERY.format(congress=''))
+    else:
+        cursor.execute(AGREEMENT_QUERY.format(congress=f' AND bills.congress = {placeholder(conn)}'), (congress,))
+    rows = cursor.fetchall()
+    cursor.execute(NAMES_QUERY)
+    names = dict(cursor.fetchall())
+    cursor.close()
+
+    rows = [ row for row in rows if row[0] in names and row[1] in names ]
+    if len(rows) == 0:
+        return AgreementCounts([], [], np.zeros((0, 0)), np.zeros((0, 0)))
+    sen_a, sen_b, agree_ab, total_ab = zip(*rows)
+    codes, senators = pd.factorize(pd.Series([ names[s] for s in sen_a + sen_b ], dtype=object))
+    i, j = codes[:len(rows)], codes[len(rows):]
+
+    # Mirror the off-diagonal pairs
+    n = len(senators)
+    agree = np.zeros((n, n))
+    total = np.zeros((n, n))
+    mirror = np.array([ a != b for a, b in zip(sen_a, sen_b) ])
+    for counts, values in ((agree, np.array(agree_ab, dtype=float)), (total, np.array(total_ab, dtype=float))):
+        np.add.at(counts, (i, j), values)
+        np.add.at(counts, (j[mirror], i[mirror]), values[mirror])
+    return AgreementCounts(list(senators), [], agree, total)
@@ -1,22 +1,59 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
-import pickle
-import re
 
 from sklearn.decomposition import PCA
 from sklearn.cluster import KMeans
 
+from similarity import fast_similarity_matrix, refresh_counts, counts_similarity, topk_neighbors
+from votes import pivot_votes, stream_coded_votes, congress_ranges
+from vote_matrix import VoteMatrix
+from vote_snapshot import refresh_snapshot, snapshot_votes
+from vote_store import VoteStore
+from db import COLUMNS
+from sql_agreement import sql_agreement_counts
+from congress_pipeline import run_congresses
+from agreement_series import pair_prefix_sums
+from vote_bits import pack_votes
+from embedding import fit_embedding, refresh_embedding
+
+# Bundle format is shared with the dashboard
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from bundle import write_bundle
+from registry import EXCLUDED, OVERRIDES
+
 import configparser
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 config = configparser.ConfigParser()
 config.read('../config.ini')
-ENDPOINT = config.get('aws', 'ENDPOINT')
-PORT = config.get('aws', 'PORT')
-USR = config.get('aws', 'USER')
-PWD = config.get('aws', 'PASSWORD')
-DB = config.get('aws', 'DATABASE')
+# Fallbacks let the module be imported (e.g. by the benchmarks) without a config file
+ENDPOINT = config.get('aws', 'ENDPOINT', fallback=None)
+PORT = config.get('aws', 'PORT', fallback=None)
+USR = config.get('aws', 'USER', fallback=None)
+PWD = config.get('aws', 'PASSWORD', fallback=None)
+DB = config.get('aws', 'DATABASE', fallback=None)
+
+# Directory for agreement counts and the vote snapshot kept between runs
+STATE_DIR = './state'
+
+# Dashboard data directory
+DATA_DIR = '../app/data'
+
+# Number of most/least similar senators kept per senator
+TOPK = 10
+
+# Function to connect to the database
+def connect():
+    return psycopg2.connect(
+        host=ENDPOINT,
+        user=USR,
+        password=PWD,
+        port=PORT,
+        database=DB
+    )
 
 # Function to get votes
 def congress_votes():
@@ -59,12 +96,8 @@ def vote2score(position):
     dicty = {'Yes': 1, 'Not Voting': 0, 'Present': 0, 'No': -1}
     return dicty[position]
 
-# Funtion to build csv from SQL query votes
-def build_csv():
-    """
-    Function to create csv by making SQL query to database and processing votes
-    """
-    votes = congress_votes()
+# Function to build score DataFrame from votes one cell at a time (reference builder)
+def build_frame_loop(votes):
     ind, cols = get_ind_col(votes)
 
     # Instantiate DataFrame with NaN values
@@ -80,12 +113,36 @@ def build_csv():
 
     return df
 
+# Funtion to build csv from SQL query votes
+def build_csv():
+    """
+    Function to create csv by making SQL query to database and processing votes
+    """
+    # Votes are streamed through a server-side cursor instead of congress_votes()
+    conn = connect()
+    coded = stream_coded_votes(conn)
+    conn.close()
+    return pivot_votes(coded)
+
+# Function to build sparse vote matrix (chronological columns) from the database
+def build_vote_matrix():
+    # Only votes past the snapshot's watermark are read from the database
+    conn = connect()
+    snapshot = refresh_snapshot(f'{STATE_DIR}/votes.npz', conn)
+    coded = snapshot_votes(conn, snapshot)
+    conn.close()
+    return VoteMatrix.from_coded(coded)
+
+# Function to build sparse vote matrix from the local vote store, reading only the given congresses
+def store_vote_matrix(store, congresses=None, senators=None):
+    return VoteMatrix.from_coded(store.read(congresses, senators))
+
 # Function to return agreement/total votes
 def vote_sim(v1, v2):
     return sum(abs(abs(v1 - v2)/2 - 1)) / len(v1)
 
-# Create matrix for voting similarity between senators
-def similarity_matrix(df):
+# Create matrix for voting similarity between senators (reference pairwise loop)
+def similarity_matrix_loop(df):
     senators = list(df.index)
     l = len(senators)
 
@@ -102,6 +159,21 @@ def similarity_matrix(df):
                 sim_mat[i][j] = np.nan
     return sim_mat
 
+# Create matrix for voting similarity between senators
+def similarity_matrix(df):
+    return fast_similarity_matrix(df)
+
+# Create similarity DataFrame for senators (in that order) with the pair counts computed in the database
+def sql_similarity(senators, congress=None):
+    conn = connect()
+    counts = sql_agreement_counts(conn, congress)
+    conn.close()
+    counted = set(counts.senators)
+    known = [ sen for sen in senators if sen in counted ]
+    sim_df = pd.DataFrame(counts_similarity(counts, known), index=known, columns=known)
+    # Senators without yes/no votes have no pairs, NaN as in counts_similarity
+    return sim_df.reindex(index=senators, columns=senators)
+
 # Retrieve most recent congress number
 def get_congress_number():
     conn = psycopg2.connect(
@@ -126,18 +198,10 @@ def get_congress_number():
     conn.close()
     return current_congress
 
-# Get list of bills from congress (by current of congress number)
-def get_bills_list(cong_number, current=True):
-    if current == True:
-        congress = get_congress_number()
-    else:
-        congress = cong_number
-        
-    bills = []
-    for col in list(df.columns):
-        if re.search(f'^{congress}', col):
-            bills.append(col)
-    return bills
+# Get list of bills from congress (df columns in chronological order, df may be a VoteMatrix)
+def get_bills_list(df, congress):
+    start, stop = congress_ranges(df.columns)[congress]
+    return list(df.columns[start:stop])
 
 # Function to get senator information
 def senator_info():
@@ -163,55 +227,56 @@ def senator_info():
     conn.close()
     return senator_info
 
-if __name__ == '__main__':
-    df = build_csv()
-    print('Received votes')
-    df = pd.DataFrame(np.where(df == 0, np.nan, df), index=df.index, columns=df.columns)
-    sim_mat = similarity_matrix(df)
-    sim_df = pd.DataFrame(sim_mat, index=df.index, columns=df.index)
-    print('Similarities created')
-    sen_info = senator_info()
-    print('Senator info received')
-
-    # Create DataFrames (similarity and votes) for current Congress
-    bills = get_bills_list(116)
-    print('List of bills for current congress created')
-    df_current = df[bills].copy(deep=True)
-    sim_current = pd.DataFrame(similarity_matrix(df_current), index=df_current.index, columns=df_current.index)
-    df_current = pd.DataFrame(
-        np.where(df_current.isna() == True, 0, df_current),
-        index=df_current.index,
-        columns=df_current.columns
+# Function to get the bill id and date of each bill (in csr_ids order)
+def bill_details(csr_ids):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT csr_id, bill_id, date FROM bills
+        ;
+        """
     )
-    print('DataFrames for current congress created')
+    details = { csr_id: (bill_id, str(date)) for csr_id, bill_id, date in cursor.fetchall() }
+    cursor.close()
+    conn.close()
+    bill_ids = [ details[csr_id][0] for csr_id in csr_ids ]
+    dates = [ details[csr_id][1] for csr_id in csr_ids ]
+    return bill_ids, dates
 
+# Function to build the PCA plot frame (reference implementation, kept for the benchmarks)
+def plot_frame_loop(df, df_current, sen_info, random_state=None, embedding=None):
+    """
+    df holds every yes/no vote (NaN otherwise), df_current the current congress (0 for no yes/no vote).
+    embedding (see embedding.py) gives x, y and label instead of the PCA/KMeans fit here.
+    """
     # Hard coding will be replaced
-    df_current.drop(index='Kelly Loeffler', inplace=True)
-    df.drop(index='Kelly Loeffler', inplace=True)
-    sim_df.drop(index='Kelly Loeffler', inplace=True)
-    sim_df.drop(columns='Kelly Loeffler', inplace=True)
-    sim_current.drop(index='Kelly Loeffler', inplace=True)
-    sim_current.drop(columns='Kelly Loeffler', inplace=True)
-
-    # Following to build DataFrame for PCA visualizations
+    df_current = df_current.drop(index='Kelly Loeffler')
+    df = df.drop(index='Kelly Loeffler')
+
     # Number of bills voted on per senator
     sen_length = []
     for sen in list(df_current.index):
         l = len(df.loc[sen].dropna())
         sen_length.append(l)
-        
+
     sen_length = pd.Series(sen_length)
     sen_length.name = 'voting_length'
     df_sl = pd.DataFrame(list(df_current.index), columns=['name']).join(sen_length)
     df_sl.set_index('name', inplace=True)
 
-    # 2 component dimensionality
-    pca = PCA(2)
-    X = pca.fit_transform(df_current)
+    if embedding is None:
+        # 2 component dimensionality
+        pca = PCA(2)
+        X = pca.fit_transform(df_current)
 
-    # Clustering algorithm
-    cl_algo = KMeans(5)
-    labels = cl_algo.fit_predict(df_current)
+        # Clustering algorithm
+        cl_algo = KMeans(5, random_state=random_state)
+        labels = cl_algo.fit_predict(df_current)
+    else:
+        rows = [ embedding.senators.index(sen) for sen in df_current.index ]
+        X = embedding.xy[rows]
+        labels = embedding.labels[rows]
     sen_name = pd.Series(df_current.index)
 
     # DataFrame for x, y data
@@ -233,7 +298,7 @@ if __name__ == '__main__':
 
     # Drop Kelly Loeffler, change Richard Shelby to Republican
     df_plot.drop('Kelly Loeffler', inplace=True) # Replace in future
-    df_plot.loc['Richard Shelby']['party'] = 'R'
+    df_plot.loc['Richard Shelby', 'party'] = 'R'
 
     # Merge DataFrames
     df_plot = df_plot.join(df_xy, on='name').join(df_lbs, on='name').join(df_sl, on='name')
@@ -243,13 +308,181 @@ if __name__ == '__main__':
     df_plot['cluster'] = np.nan
     for i in list(df_plot['label'].unique()):
         temp = df_plot.loc[df_plot['label'] == i]
-        cluster = temp.loc[temp['voting_length'] == max(temp['voting_length'])]['name']
+        # First of the senators tied on the most votes, as plot_frame
+        cluster = temp.loc[temp['voting_length'] == max(temp['voting_length'])]['name'].iloc[:1]
         df_plot['cluster'] = np.where(df_plot['label'] == i, cluster + ' Cluster', df_plot['cluster'])
+    return df_plot
+
+# Function to build the PCA plot frame (name, party, gender, state, x, y, label, voting_length, cluster)
+def plot_frame(current, voting_length, sen_info, embedding=None):
+    """
+    current is the vote matrix of the current congress (its senators are the
+    ones plotted) and voting_length their number of yes/no votes over all
+    congresses. embedding (see embedding.py) gives x, y and label, fit here
+    when not given. Rows follow sen_info, without registry.EXCLUDED and with
+    registry.OVERRIDES applied.
+    """
+    if embedding is None:
+        embedding = fit_embedding(current)
+    X = embedding.xy
+    labels = embedding.labels
+    df_votes = pd.DataFrame({
+        'name': current.senators,
+        'x': X[:, 0],
+        'y': X[:, 1],
+        'label': labels,
+        'voting_length': voting_length,
+    })
+
+    df_info = pd.DataFrame(sen_info, columns=COLUMNS['senators'])
+    df_info['name'] = df_info['f_name'] + ' ' + df_info['l_name']
+    df_info = df_info.loc[~df_info['name'].isin(EXCLUDED), ['name', 'party', 'gender', 'state']]
+    for name, fields in OVERRIDES.items():
+        df_info.loc[df_info['name'] == name, list(fields)] = list(fields.values())
+    df_plot = df_info.merge(df_votes, on='name', how='left').reset_index(drop=True)
+
+    # Each cluster is named after its member with the most votes
+    senior = df_plot.loc[df_plot.groupby('label')['voting_length'].idxmax(), ['label', 'name']]
+    df_plot['cluster'] = df_plot['label'].map(dict(zip(senior['label'], senior['name'] + ' Cluster')))
+    return df_plot
+
+# Function to create similarity matrix and neighbor index for each congress
+def congress_cube(votes, senators, groups, sessions=False):
+    """
+    senators (and their groups) give the row/column order of every slice. The
+    congresses are analyzed in parallel (see congress_pipeline), each result is
+    also saved as an artifact in STATE_DIR/congresses.
+    """
+    ranges = congress_ranges(votes.csr_ids)
+    congresses = sorted(ranges)
+    results = run_congresses(
+        votes, senators, groups, STATE_DIR, out_dir=f'{STATE_DIR}/congresses', sessions=sessions, topk=TOPK
+    )
+    n = len(senators)
+    cube = np.full((len(congresses), n, n), np.nan, dtype=np.float32)
+    topk = { name: np.full((len(congresses), n, TOPK), -1, dtype=np.int32) for name in
+             ('most', 'least', 'party_most', 'party_least') }
+    members = {}
+    k = min(TOPK, n)
+    for i, congress in enumerate(congresses):
+        result = results[(congress, None)]
+        cube[i] = result.sim
+        for name in topk:
+            topk[name][i, :, :k] = getattr(result, name)
+        voted = set(result.members)
+        members[congress] = [ sen for sen in senators if sen in voted ]
+    return congresses, ranges, cube, topk, members
+
+# Function to write dashboard data as a binary bundle (float32 matrices + json index)
+def dashboard_bundle(sim_df, sim_current, df_plot, sen_info, votes, congress, bill_ids, dates, sessions=False):
+    arrays = {
+        'sim': sim_df.to_numpy(dtype=np.float32),
+        'sim_current': sim_current.to_numpy(dtype=np.float32),
+    }
 
-    # Convert DataFrames to csvs and senator list to pickle
-    sim_df.to_csv('../app/data/voting_sim.csv')
-    sim_current.to_csv('../app/data/vs_current.csv')
-    df_plot.to_csv('../app/data/sen_data.csv')
-    with open('../app/data/sen_info.p', 'wb') as f:
-        pickle.dump(sen_info, f)
-    print('CSVs and pickles created')
+    # Neighbor index for the current congress, overall and within party
+    senators = list(sim_current.index)
+    party = df_plot.drop_duplicates('name').set_index('name')['party'].reindex(senators).to_numpy()
+    arrays['topk_most'], arrays['topk_least'] = topk_neighbors(sim_current.to_numpy(), senators, TOPK)
+    arrays['topk_party_most'], arrays['topk_party_least'] = topk_neighbors(
+        sim_current.to_numpy(), senators, TOPK, groups=party
+    )
+
+    # Similarity and neighbor index of every congress, on the same senator axis
+    congresses, ranges, cube, topk, members = congress_cube(votes, senators, party, sessions)
+    arrays['sim_cube'] = cube
+    for name, array in topk.items():
+        arrays[f'topk_cube_{name}'] = array
+
+    # Cumulative agreement of each pair of current senators (the ones voting in the current
+    # congress, senators spans the whole history) by vote day, for rolling rates
+    pair_senators = members[int(congress)]
+    days, arrays['pair_agree_cum'], arrays['pair_total_cum'] = pair_prefix_sums(votes, pair_senators, dates)
+
+    # Packed yes/no/abstain bitsets of every senator over the roll calls, for disagreement lists
+    arrays['bits_yes'], arrays['bits_no'], arrays['bits_abstain'] = pack_votes(votes, list(sim_df.index))
+    index = {
+        'senators': list(sim_df.index),
+        'current_senators': list(sim_current.index),
+        'pair_senators': pair_senators,
+        'topk': TOPK,
+        'current_congress': int(congress),
+        'congresses': congresses,
+        'congress_ranges': { str(c): list(r) for c, r in ranges.items() },
+        'congress_senators': { str(c): sens for c, sens in members.items() },
+        'vote_days': days,
+        'csr_ids': votes.csr_ids,
+        'bill_ids': bill_ids,
+        'bill_dates': dates,
+        'sen_info': [ list(sen) for sen in sen_info ],
+        'sen_data': df_plot.to_dict(orient='list'),
+    }
+    return write_bundle(f'{DATA_DIR}/bundle', arrays, index)
+
+if __name__ == '__main__':
+    # python to_csv.py [--sql] [--sessions] [--store] [--minibatch], --sql counts agreements in the database
+    # instead of from the votes, --sessions also analyzes each session of every congress
+    sql_mode = '--sql' in sys.argv[1:]
+    sessions = '--sessions' in sys.argv[1:]
+    # --store reads votes from the local vote store (see vote_store.py) instead of the database
+    store = VoteStore() if '--store' in sys.argv[1:] else None
+    # --minibatch embeds with incremental PCA and MiniBatchKMeans (see embedding.py)
+    if '--minibatch' in sys.argv[1:]:
+        embed_modes = {'pca': 'incremental', 'kmeans': 'minibatch'}
+    else:
+        embed_modes = {'pca': 'randomized', 'kmeans': 'full'}
+    if store is not None:
+        votes = store_vote_matrix(store)
+    else:
+        votes = build_vote_matrix()
+    print('Received votes')
+    if sql_mode:
+        sim_df = sql_similarity(votes.senators)
+    else:
+        counts = refresh_counts(f'{STATE_DIR}/counts_all.npz', votes)
+        sim_mat = counts_similarity(counts, votes.senators)
+        sim_df = pd.DataFrame(sim_mat, index=votes.senators, columns=votes.senators)
+    print('Similarities created')
+    sen_info = senator_info()
+    print('Senator info received')
+
+    # Create DataFrames (similarity and votes) for current Congress
+    congress = get_congress_number()
+    if store is not None:
+        # Only the current congress partition is read, on the same senator axis
+        current = store_vote_matrix(store, [congress], votes.senators)
+    else:
+        current = votes.congress(congress)
+    print('List of bills for current congress created')
+    if sql_mode:
+        sim_current = sql_similarity(current.senators, congress)
+    else:
+        cur_counts = refresh_counts(f'{STATE_DIR}/counts_{congress}.npz', current)
+        sim_current = pd.DataFrame(
+            counts_similarity(cur_counts, current.senators),
+            index=current.senators,
+            columns=current.senators
+        )
+    # Senators left out of the dashboard (registry.EXCLUDED), dropped once from every input
+    excluded = [ sen for sen in EXCLUDED if sen in set(votes.senators) ]
+    votes = votes.drop_senators(excluded)
+    current = current.drop_senators(excluded)
+    sim_df = sim_df.drop(index=excluded, columns=excluded)
+    sim_current = sim_current.drop(index=excluded, columns=excluded)
+    print('DataFrames for current congress created')
+
+    # DataFrame for PCA visualizations, refit only when the current congress votes changed. The
+    # cache is separate from congress_pipeline's embedding_<congress>.npz, which embeds the
+    # congress's voting senators only with its own settings.
+    embedding = refresh_embedding(f'{STATE_DIR}/sen_data_embedding_{congress}.npz', current, **embed_modes)
+    df_plot = plot_frame(current, votes.voting_length(), sen_info, embedding)
+
+    # Convert DataFrames to csvs and write the dashboard bundle
+    sim_df.to_csv(f'{DATA_DIR}/voting_sim.csv')
+    sim_current.to_csv(f'{DATA_DIR}/vs_current.csv')
+    df_plot.to_csv(f'{DATA_DIR}/sen_data.csv')
+    bill_ids, dates = bill_details(votes.csr_ids)
+    generation = dashboard_bundle(
+        sim_df, sim_current, df_plot, sen_info, votes, congress, bill_ids, dates, sessions
+    )
+    print(f'CSVs and bundle {generation} created')
@@ -0,0 +1,16 @@
+import numpy as np
+
+# Function to pack each senator's votes into bitsets over the roll-call axis
+def pack_votes(votes, senators):
+    """
+    Returns (yes, no, abstain) uint8 arrays of shape (senators, ceil(bills / 8)),
+    bit j (np.packbits order) of row i is set when senators[i] voted that way on
+    votes.csr_ids[j]. abstain is present or not voting (VoteMatrix keeps them together).
+    """
+    block = votes.select(senators=senators)
+    scores = block.scores.toarray()
+    return (
+        np.packbits(scores == 1, axis=1),
+        np.packbits(scores == -1, axis=1),
+        np.packbits(block.abstain.toarray(), axis=1),
+    )
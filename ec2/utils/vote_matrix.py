@@ -0,0 +1,168 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from votes import POSITION_SCORES, bill_key, congress_ranges
+
+# Sparse senator x bill vote matrix
+class VoteMatrix:
+    """
+    scores is a CSR int8 matrix holding 1 (yes) and -1 (no) for cast votes and
+    abstain a CSR bool matrix of present/not voting positions, cells with no
+    entry in either are bills the senator was not in office for. Memory grows
+    with the number of votes, not senators x roll calls. Columns are kept in
+    chronological order so each congress is a contiguous range.
+    """
+    def __init__(self, senators, csr_ids, scores, abstain):
+        self.senators = list(senators)
+        self.csr_ids = list(csr_ids)
+        self.scores = sp.csr_matrix(scores, dtype=np.int8)
+        self.abstain = sp.csr_matrix(abstain, dtype=bool)
+
+    # DataFrame-like names, so helpers written for the dense matrix keep working
+    @property
+    def index(self):
+        return self.senators
+
+    @property
+    def columns(self):
+        return self.csr_ids
+
+    @property
+    def shape(self):
+        return len(self.senators), len(self.csr_ids)
+
+    @classmethod
+    def from_coded(cls, coded):
+        """
+        Build from votes.CodedVotes, a repeated (senator, bill) keeps the last position
+        """
+        n, m = len(coded.senators), len(coded.csr_ids)
+
+        # Chronological column order
+        order = sorted(range(m), key=lambda j: bill_key(coded.csr_ids[j]))
+        new_col = np.empty(m, dtype=np.int32)
+        new_col[order] = np.arange(m, dtype=np.int32)
+        rows = coded.sen_codes
+        cols = new_col[coded.csr_codes]
+
+        # Last occurrence of each cell wins (as when filling a DataFrame row by row)
+        cell = rows.astype(np.int64) * max(m, 1) + cols
+        _, last = np.unique(cell[::-1], return_index=True)
+        keep = len(cell) - 1 - last
+        rows, cols = rows[keep], cols[keep]
+        scores = POSITION_SCORES[coded.pos_codes[keep]]
+
+        cast = scores != 0
+        return cls(
+            coded.senators,
+            [ coded.csr_ids[j] for j in order ],
+            sp.csr_matrix((scores[cast], (rows[cast], cols[cast])), shape=(n, m)),
+            sp.csr_matrix((np.ones((~cast).sum(), dtype=bool), (rows[~cast], cols[~cast])), shape=(n, m)),
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Build from a dense score DataFrame, 0 is taken as present/not voting
+        """
+        values = df.to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        scores = np.where(present, values, 0).astype(np.int8)
+        return cls(df.index, df.columns, scores, present & (scores == 0))
+
+    def save(self, path):
+        """
+        Write the CSR arrays as .npy files in directory path (see load)
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, matrix in (('scores', self.scores), ('abstain', self.abstain)):
+            for part in ('data', 'indices', 'indptr'):
+                np.save(os.path.join(path, f'{name}_{part}.npy'), getattr(matrix, part))
+        with open(os.path.join(path, 'labels.json'), 'w') as f:
+            json.dump({'senators': self.senators, 'csr_ids': self.csr_ids}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Open a matrix written by save, the arrays are memory maps so processes
+        loading the same files share their pages instead of holding copies
+        """
+        with open(os.path.join(path, 'labels.json')) as f:
+            labels = json.load(f)
+        shape = (len(labels['senators']), len(labels['csr_ids']))
+        matrices = {
+            name: sp.csr_matrix(
+                tuple(np.load(os.path.join(path, f'{name}_{part}.npy'), mmap_mode=mmap_mode)
+                      for part in ('data', 'indices', 'indptr')),
+                shape=shape
+            )
+            for name in ('scores', 'abstain')
+        }
+        return cls(labels['senators'], labels['csr_ids'], matrices['scores'], matrices['abstain'])
+
+    def select(self, senators=None, csr_ids=None):
+        rows = slice(None)
+        cols = slice(None)
+        if senators is not None:
+            position = { sen: i for i, sen in enumerate(self.senators) }
+            rows = np.array([ position[sen] for sen in senators ], dtype=int)
+        if csr_ids is not None:
+            position = { bill: j for j, bill in enumerate(self.csr_ids) }
+            cols = np.array([ position[bill] for bill in csr_ids ], dtype=int)
+        return VoteMatrix(
+            self.senators if senators is None else senators,
+            self.csr_ids if csr_ids is None else csr_ids,
+            self.scores[rows][:, cols],
+            self.abstain[rows][:, cols],
+        )
+
+    def column_range(self, start, stop):
+        return VoteMatrix(
+            self.senators,
+            self.csr_ids[start:stop],
+            self.scores[:, start:stop],
+            self.abstain[:, start:stop],
+        )
+
+    def congress(self, congress):
+        start, stop = congress_ranges(self.csr_ids)[congress]
+        return self.column_range(start, stop)
+
+    def drop_senators(self, senators):
+        senators = set(senators)
+        return self.select(senators=[ sen for sen in self.senators if sen not in senators ])
+
+    def cast(self):
+        return self.scores != 0
+
+    def voting_length(self):
+        """
+        Number of yes/no votes of each senator
+        """
+        return self.scores.getnnz(axis=1)
+
+    def active_senators(self):
+        return [ sen for sen, n in zip(self.senators, self.voting_length()) if n > 0 ]
+
+    def agreement_counts(self):
+        """
+        Same as similarity.agreement_counts on the dense matrix with abstentions as NaN
+        """
+        yes = (self.scores == 1).astype(np.float64)
+        no = (self.scores == -1).astype(np.float64)
+        cast = yes + no
+        agree = (yes @ yes.T + no @ no.T).toarray()
+        total = (cast @ cast.T).toarray()
+        return agree, total
+
+    def to_frame(self, fill=np.nan, dtype=np.float32):
+        """
+        Dense DataFrame of yes/no scores, everything else is fill (meant for one congress)
+        """
+        values = self.scores.toarray().astype(dtype)
+        values[~self.cast().toarray()] = fill
+        return pd.DataFrame(values, index=self.senators, columns=self.csr_ids, copy=False)
@@ -0,0 +1,142 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from db import placeholder
+from votes import VOTES_QUERY, stream_vote_codes, name_votes
+
+# Latest bill date, read before streaming so rows committed meanwhile are fetched again next run
+LAST_DATE_QUERY = """
+    SELECT MAX(date) FROM bills
+    ;
+    """
+
+# Votes on bills from the watermark date on (the watermark day is fetched again,
+# roll calls later that day may have been added since)
+VOTES_SINCE_QUERY = """
+    SELECT votes.sen_id, votes.csr_id, votes.position
+    FROM votes
+    JOIN bills ON votes.csr_id = bills.csr_id
+    JOIN senators ON votes.sen_id = senators.sen_id
+    WHERE bills.date >= {mark}
+    ;
+    """
+
+# Number of votes before the watermark date, should all be in the snapshot already
+VOTES_BEFORE_QUERY = """
+    SELECT COUNT(*)
+    FROM votes
+    JOIN bills ON votes.csr_id = bills.csr_id
+    JOIN senators ON votes.sen_id = senators.sen_id
+    WHERE bills.date < {mark}
+    ;
+    """
+
+# Coded votes keyed by sen_id (names are looked up on each run), watermark is
+# the latest bills.date when the snapshot was taken
+VoteSnapshot = namedtuple(
+    'VoteSnapshot',
+    ['sen_ids', 'csr_ids', 'sen_codes', 'csr_codes', 'pos_codes', 'watermark']
+)
+
+def empty_snapshot():
+    empty = np.array([], dtype=np.int32)
+    return VoteSnapshot([], [], empty, empty, np.array([], dtype=np.int8), None)
+
+def save_snapshot(path, snapshot):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp.npz'
+    np.savez(
+        tmp_path,
+        sen_ids=np.array(snapshot.sen_ids, dtype=str),
+        csr_ids=np.array(snapshot.csr_ids, dtype=str),
+        sen_codes=snapshot.sen_codes,
+        csr_codes=snapshot.csr_codes,
+        pos_codes=snapshot.pos_codes,
+        watermark=np.array('' if snapshot.watermark is None else snapshot.watermark),
+    )
+    os.replace(tmp_path, path)
+
+def load_snapshot(path):
+    if not os.path.exists(path):
+        return empty_snapshot()
+    with np.load(path) as f:
+        return VoteSnapshot(
+            list(f['sen_ids']),
+            list(f['csr_ids']),
+            f['sen_codes'],
+            f['csr_codes'],
+            f['pos_codes'],
+            str(f['watermark']) or None,
+        )
+
+def last_date(conn):
+    cursor = conn.cursor()
+    cursor.execute(LAST_DATE_QUERY)
+    date = cursor.fetchone()[0]
+    cursor.close()
+    return None if date is None else str(date)
+
+# Function to read every vote into a new snapshot
+def full_snapshot(conn, batch_size=50000):
+    watermark = last_date(conn)
+    sen_table = {}
+    csr_table = {}
+    sen_codes, csr_codes, pos_codes = stream_vote_codes(
+        conn, VOTES_QUERY, sen_table=sen_table, csr_table=csr_table, batch_size=batch_size
+    )
+    return VoteSnapshot(list(sen_table), list(csr_table), sen_codes, csr_codes, pos_codes, watermark)
+
+# Function to bring the snapshot at path up to date with the database
+def refresh_snapshot(path, conn, batch_size=50000):
+    """
+    Only votes on bills dated on or after the watermark are read, rows of bills
+    already in the snapshot are dropped. The snapshot is rebuilt from a full
+    read when there is no watermark or the database disagrees with it (fewer or
+    more votes before the watermark or on refetched bills, e.g. after a backfill).
+    """
+    snapshot = load_snapshot(path)
+    if snapshot.watermark is None:
+        snapshot = full_snapshot(conn, batch_size)
+        save_snapshot(path, snapshot)
+        return snapshot
+
+    watermark = last_date(conn)
+    mark = placeholder(conn)
+    sen_table = { sen_id: i for i, sen_id in enumerate(snapshot.sen_ids) }
+    csr_table = { csr_id: j for j, csr_id in enumerate(snapshot.csr_ids) }
+    sen_codes, csr_codes, pos_codes = stream_vote_codes(
+        conn, VOTES_SINCE_QUERY.format(mark=mark), (snapshot.watermark,),
+        sen_table=sen_table, csr_table=csr_table, batch_size=batch_size
+    )
+
+    cursor = conn.cursor()
+    cursor.execute(VOTES_BEFORE_QUERY.format(mark=mark), (snapshot.watermark,))
+    before = cursor.fetchone()[0]
+    cursor.close()
+
+    # Codes below the old number of bills are bills the snapshot already has
+    known = csr_codes < len(snapshot.csr_ids)
+    refetched = np.isin(snapshot.csr_codes, np.unique(csr_codes[known]))
+    if known.sum() != refetched.sum() or before != (~refetched).sum():
+        print(f'{path} out of sync with the database, rebuilding')
+        snapshot = full_snapshot(conn, batch_size)
+        save_snapshot(path, snapshot)
+        return snapshot
+
+    new = ~known
+    snapshot = VoteSnapshot(
+        list(sen_table),
+        list(csr_table),
+        np.concatenate([snapshot.sen_codes, sen_codes[new]]),
+        np.concatenate([snapshot.csr_codes, csr_codes[new]]),
+        np.concatenate([snapshot.pos_codes, pos_codes[new]]),
+        watermark or snapshot.watermark,
+    )
+    save_snapshot(path, snapshot)
+    return snapshot
+
+# Function to give the snapshot as votes.CodedVotes keyed by senator name
+def snapshot_votes(conn, snapshot):
+    return name_votes(conn, *snapshot[:5])
@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db import connect
+from votes import CodedVotes, VOTES_QUERY, position_codes, stream_vote_codes, POSITIONS
+
+# Directory of the local vote store
+STORE_DIR = './store'
+
+# Function to pack (sen_code, csr_code) pairs of the store in one int64 each
+def pack_pairs(sen_code, csr_code):
+    return (np.asarray(sen_code, dtype=np.int64) << 32) | np.asarray(csr_code, dtype=np.int64)
+
+# Columnar vote store with one partition per congress
+class VoteStore:
+    """
+    Each append writes a part file (congress=<c>/part-<time>.npz) per congress
+    holding sen_code, csr_code and pos_code columns. Codes index the senators
+    and bills dictionaries of manifest.json, which also lists the parts and is
+    replaced last, so a failed append leaves the store as it was. A vote of a
+    senator on a bill already in the store is skipped (the first position wins,
+    like ON CONFLICT DO NOTHING in db.write_batch), so appending the same rows
+    twice is safe.
+    """
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def manifest(self):
+        if not self.exists():
+            return {'senators': {}, 'bills': {}, 'partitions': {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def stored_pairs(self, manifest, congresses):
+        """
+        (sen_code, csr_code) pairs of the parts of the given congresses, packed in one int64
+        """
+        pairs = [np.array([], dtype=np.int64)]
+        for c in congresses:
+            for part in manifest['partitions'].get(str(c), []):
+                with np.load(os.path.join(self.root, part)) as f:
+                    pairs.append(pack_pairs(f['sen_code'], f['csr_code']))
+        return np.concatenate(pairs)
+
+    def congresses(self):
+        return sorted(int(c) for c in self.manifest()['partitions'])
+
+    def append(self, bills=(), senators=(), votes=()):
+        """
+        Rows are tuples in db.COLUMNS order (as given to db.write_batch). Votes
+        on bills neither stored nor given are dropped, like the foreign key
+        would. Returns the number of rows added per dictionary/table.
+        """
+        manifest = self.manifest()
+        sen_table = manifest['senators']
+        bill_table = manifest['bills']
+
+        added = {'bills': 0, 'senators': 0, 'votes': 0}
+        for sen_id, *row in senators:
+            if sen_table.get(sen_id) is None:
+                added['senators'] += 1
+                sen_table[sen_id] = row
+        for csr_id, *row in bills:
+            if csr_id not in bill_table:
+                added['bills'] += 1
+                bill_table[csr_id] = row
+
+        votes = [ vote for vote in votes if vote[1] in bill_table ]
+        if votes:
+            # Senators without a row yet are kept as codes, read() leaves them out until they get one
+            for sen_id, _, _ in votes:
+                sen_table.setdefault(sen_id, None)
+            sen_codes = { sen_id: i for i, sen_id in enumerate(sen_table) }
+            csr_codes = { csr_id: j for j, csr_id in enumerate(bill_table) }
+            sen_ids, csr_ids, positions = zip(*votes)
+            columns = {
+                'sen_code': np.array([ sen_codes[s] for s in sen_ids ], dtype=np.int32),
+                'csr_code': np.array([ csr_codes[c] for c in csr_ids ], dtype=np.int32),
+                'pos_code': position_codes(positions),
+            }
+            congress = np.array([ int(bill_table[c][0]) for c in csr_ids ])
+
+            # First vote of each pair in the batch, if the pair is not stored yet
+            pairs = pack_pairs(columns['sen_code'], columns['csr_code'])
+            new = np.zeros(len(pairs), dtype=bool)
+            new[np.unique(pairs, return_index=True)[1]] = True
+            new &= ~np.isin(pairs, self.stored_pairs(manifest, np.unique(congress)))
+            columns = { k: v[new] for k, v in columns.items() }
+            congress = congress[new]
+
+            stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+            for c in np.unique(congress):
+                part = f'congress={c}/part-{stamp}.npz'
+                os.makedirs(os.path.join(self.root, f'congress={c}'), exist_ok=True)
+                np.savez(os.path.join(self.root, part), **{ k: v[congress == c] for k, v in columns.items() })
+                manifest['partitions'].setdefault(str(c), []).append(part)
+            added['votes'] = int(new.sum())
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        return added
+
+    def read(self, congresses=None, senators=None):
+        """
+        Votes of the given congresses (all by default) as votes.CodedVotes keyed
+        by senator name, only the parts of those congresses are opened. senators
+        fixes the senator axis (names, in order, rows without votes kept),
+        otherwise it is the voting senators in order of first appearance.
+        """
+        manifest = self.manifest()
+        keys = manifest['partitions'] if congresses is None else [ str(c) for c in congresses ]
+        parts = [ part for key in keys for part in manifest['partitions'].get(key, []) ]
+        columns = {'sen_code': [], 'csr_code': [], 'pos_code': []}
+        for part in parts:
+            with np.load(os.path.join(self.root, part)) as f:
+                for name in columns:
+                    columns[name].append(f[name])
+        sen_code, csr_code, pos_code = (
+            np.concatenate(columns[name]) if columns[name] else np.array([], dtype=np.int32)
+            for name in ('sen_code', 'csr_code', 'pos_code')
+        )
+
+        # Names of the sen_ids (as the senators join in VOTES_QUERY, ids without a row are left out)
+        names = np.array([
+            None if row is None else f'{row[0]} {row[1]}' for row in manifest['senators'].values()
+        ], dtype=object)
+        vote_names = names[sen_code] if len(names) else np.array([], dtype=object)
+        if senators is None:
+            keep = pd.notna(vote_names)
+            name_codes, senators = pd.factorize(pd.Series(vote_names[keep], dtype=object))
+        else:
+            position = { sen: i for i, sen in enumerate(senators) }
+            name_codes = np.array([ position.get(name, -1) for name in vote_names ], dtype=np.int64)
+            keep = name_codes >= 0
+            name_codes = name_codes[keep]
+
+        bill_ids = list(manifest['bills'])
+        csr_codes, csr_uniques = pd.factorize(csr_code[keep])
+        return CodedVotes(
+            list(senators),
+            [ bill_ids[j] for j in csr_uniques ],
+            name_codes.astype(np.int32),
+            csr_codes.astype(np.int32),
+            pos_code[keep].astype(np.int8),
+        )
+
+    def import_db(self, conn, batch_size=50000):
+        """
+        Append every senator, bill and vote of the database (to seed the store)
+        """
+        cursor = conn.cursor()
+        cursor.execute('SELECT sen_id, f_name, l_name, party, gender, state FROM senators;')
+        senators = cursor.fetchall()
+        cursor.execute('SELECT csr_id, congress, session, roll_call, bill_id, date FROM bills;')
+        bills = [ row[:5] + (str(row[5]),) for row in cursor.fetchall() ]
+        cursor.close()
+
+        sen_table = {}
+        csr_table = {}
+        sen_codes, csr_codes, pos_codes = stream_vote_codes(
+            conn, VOTES_QUERY, sen_table=sen_table, csr_table=csr_table, batch_size=batch_size
+        )
+        sen_ids = np.array(list(sen_table), dtype=object)
+        csr_ids = np.array(list(csr_table), dtype=object)
+        positions = np.array(POSITIONS, dtype=object)
+        votes = zip(sen_ids[sen_codes], csr_ids[csr_codes], positions[pos_codes])
+        return self.append(bills=bills, senators=senators, votes=list(votes))
+
+if __name__ == '__main__':
+    # python vote_store.py --import, seeds the store from the database
+    if '--import' in sys.argv[1:]:
+        conn = connect()
+        print(VoteStore().import_db(conn))
+        conn.close()
+    store = VoteStore()
+    print(f'{store.root}: congresses {store.congresses()}')
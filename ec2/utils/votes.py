@@ -0,0 +1,174 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Positions in code order and their scores (same values as to_csv.vote2score)
+POSITIONS = ('Yes', 'No', 'Present', 'Not Voting')
+POSITION_SCORES = np.array([1, -1, 0, 0], dtype=np.int8)
+
+# Votes as integer codes, senators and csr_ids hold the names for the codes
+CodedVotes = namedtuple(
+    'CodedVotes',
+    ['senators', 'csr_ids', 'sen_codes', 'csr_codes', 'pos_codes']
+)
+
+# Function to map position strings to position codes
+def position_codes(positions):
+    codes = pd.Categorical(positions, categories=POSITIONS).codes
+    if (codes < 0).any():
+        unknown = set(np.asarray(positions, dtype=object)[codes < 0])
+        raise KeyError(f'Unknown vote positions: {sorted(unknown)}')
+    return codes.astype(np.int8)
+
+# Function to encode (senator, csr_id, position) rows from congress_votes
+def encode_votes(votes):
+    """
+    Senators and csr_ids are numbered in order of first appearance, which is the
+    row and column order get_ind_col gives
+    """
+    if len(votes) == 0:
+        empty = np.array([], dtype=np.int32)
+        return CodedVotes([], [], empty, empty, np.array([], dtype=np.int8))
+    names, csr_ids, positions = zip(*votes)
+    sen_codes, senators = pd.factorize(pd.Series(names, dtype=object))
+    csr_codes, bills = pd.factorize(pd.Series(csr_ids, dtype=object))
+    return CodedVotes(
+        list(senators),
+        list(bills),
+        sen_codes.astype(np.int32),
+        csr_codes.astype(np.int32),
+        position_codes(positions),
+    )
+
+# Function to pivot coded votes into a senator x csr_id score DataFrame
+def pivot_votes(coded, dtype=np.float32):
+    """
+    Scores are looked up from POSITION_SCORES, cells without a vote are NaN
+    """
+    matrix = np.full((len(coded.senators), len(coded.csr_ids)), np.nan, dtype=dtype)
+    matrix[coded.sen_codes, coded.csr_codes] = POSITION_SCORES[coded.pos_codes]
+    return pd.DataFrame(matrix, index=coded.senators, columns=coded.csr_ids, copy=False)
+
+# Query for streaming votes, names are joined on afterwards from the senators table
+VOTES_QUERY = """
+    SELECT votes.sen_id, votes.csr_id, votes.position
+    FROM votes
+    JOIN bills ON votes.csr_id = bills.csr_id
+    JOIN senators ON votes.sen_id = senators.sen_id
+    ;
+    """
+
+# COALESCE keeps the other part of a name when one is NULL, as CONCAT did in congress_votes
+NAMES_QUERY = """
+    SELECT sen_id, COALESCE(f_name, '') || ' ' || COALESCE(l_name, '') FROM senators
+    ;
+    """
+
+# Function to open a server-side cursor where the driver supports one
+def open_cursor(conn, name):
+    """
+    psycopg2 connections give a named (server-side) cursor, DB-API drivers
+    without named cursors (e.g. sqlite3) fall back to a regular cursor
+    """
+    try:
+        return conn.cursor(name=name)
+    except TypeError:
+        return conn.cursor()
+
+# Function to give codes to values, extending the code table as new values appear
+def extend_codes(values, table):
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    lookup = np.array([ table.setdefault(value, len(table)) for value in uniques ], dtype=np.int32)
+    return lookup[codes]
+
+# Function to stream (sen_id, csr_id, position) rows of a query into code arrays
+def stream_vote_codes(conn, query, params=None, sen_table=None, csr_table=None, batch_size=50000):
+    """
+    Rows are fetched batch_size at a time so only one batch of Python tuples is
+    alive at once. Codes index sen_table/csr_table (sen_id and csr_id to code),
+    which are extended in place, so codes of an earlier stream stay valid.
+    """
+    sen_table = {} if sen_table is None else sen_table
+    csr_table = {} if csr_table is None else csr_table
+    sen_chunks = []
+    csr_chunks = []
+    pos_chunks = []
+
+    cursor = open_cursor(conn, 'congress_votes')
+    if params is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if len(rows) == 0:
+            break
+        sen_ids, csr_ids, positions = zip(*rows)
+        sen_chunks.append(extend_codes(sen_ids, sen_table))
+        csr_chunks.append(extend_codes(csr_ids, csr_table))
+        pos_chunks.append(position_codes(positions))
+    cursor.close()
+
+    empty = np.array([], dtype=np.int32)
+    return (
+        np.concatenate(sen_chunks) if sen_chunks else empty,
+        np.concatenate(csr_chunks) if csr_chunks else empty,
+        np.concatenate(pos_chunks) if pos_chunks else np.array([], dtype=np.int8),
+    )
+
+# Function to turn votes coded by sen_id into CodedVotes keyed by senator name
+def name_votes(conn, sen_ids, csr_ids, sen_codes, csr_codes, pos_codes):
+    cursor = conn.cursor()
+    cursor.execute(NAMES_QUERY)
+    names = dict(cursor.fetchall())
+    cursor.close()
+
+    # Senators are keyed by name (as in congress_votes), so ids sharing a name merge
+    name_codes, senators = pd.factorize(pd.Series([ names[sen_id] for sen_id in sen_ids ], dtype=object))
+    return CodedVotes(
+        list(senators),
+        list(csr_ids),
+        name_codes.astype(np.int32)[sen_codes],
+        csr_codes,
+        pos_codes,
+    )
+
+# Function to stream votes from the database straight into coded arrays
+def stream_coded_votes(conn, batch_size=50000):
+    """
+    Senator names are looked up once per senator instead of per vote
+    """
+    sen_table = {}
+    csr_table = {}
+    sen_codes, csr_codes, pos_codes = stream_vote_codes(
+        conn, VOTES_QUERY, sen_table=sen_table, csr_table=csr_table, batch_size=batch_size
+    )
+    return name_votes(conn, list(sen_table), list(csr_table), sen_codes, csr_codes, pos_codes)
+
+# Function to split csr_id ('congress.session.roll_call') into a sortable key
+def bill_key(csr_id):
+    congress, session, roll_call = csr_id.split('.')
+    return int(congress), int(session), int(roll_call)
+
+# Function to order bills chronologically (by congress, session, roll call)
+def sort_bills(csr_ids):
+    return sorted(csr_ids, key=bill_key)
+
+# Function to find the column range of each congress in chronologically ordered bills
+def congress_ranges(csr_ids):
+    ranges = {}
+    for i, csr_id in enumerate(csr_ids):
+        congress = bill_key(csr_id)[0]
+        start, _ = ranges.get(congress, (i, i))
+        ranges[congress] = (start, i + 1)
+    return ranges
+
+# Function to find the column range of each (congress, session) in chronologically ordered bills
+def session_ranges(csr_ids):
+    ranges = {}
+    for i, csr_id in enumerate(csr_ids):
+        congress, session, _ = bill_key(csr_id)
+        start, _ = ranges.get((congress, session), (i, i))
+        ranges[(congress, session)] = (start, i + 1)
+    return ranges